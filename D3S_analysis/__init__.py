@@ -0,0 +1,8 @@
+'''
+D3S spectrum analysis.
+
+The modules import each other by name so the scripts can be run from this
+directory. The DoseNet tools at the repository root use the shared ones as
+a package:
+    from D3S_analysis import spectra_io
+'''
@@ -0,0 +1,144 @@
+'''
+Levenberg-Marquardt least squares fits of many windows at once.
+
+Every window is fitted with the same model over the same x values, so the
+residuals, jacobians and normal equations of all windows are stacked
+arrays and each iteration is a handful of numpy calls for the whole batch:
+    pars, errs, niter, converged = batch_fitting.batch_leastsq( \
+        fitter.pure_gaus_plus_exp, points, counts, pinit, bounds)
+
+The model must broadcast over stacked parameters: it is called as
+fit_function(x, p) with p[i] the column (nwindows x 1) of parameter i,
+and its .jacobian returns nwindows x len(x) x nparameters (the pure
+models of spectra_fitting_tools do).
+
+Each window keeps its own damping and leaves the batch as soon as it has
+converged; the loop stops when no window is left. After a good step the
+damping follows the ratio of the actual to the predicted drop of the sum
+of squares (Nielsen's update) rather than being divided by 10, which
+zig-zags along the narrow valley of the exponential's amplitude and
+slope.
+'''
+import numpy as np
+
+def _evaluate(fit_function, x, P):
+    # model values for every row of P
+    return fit_function(x, P.T[:,:,None])
+
+def _solve(A, b):
+    # damped normal equations of every window, pinv if any is singular
+    try:
+        return np.linalg.solve(A, b[...,None])[...,0]
+    except np.linalg.LinAlgError:
+        return np.einsum('kij,kj->ki', np.linalg.pinv(A), b)
+
+def batch_leastsq(fit_function, x, Y, P0, bounds=None, max_iter=200,
+                  initial_damping=1e-5, ftol=1.49012e-08, xtol=1.49012e-08):
+    '''
+    Fit every row of Y with fit_function, starting from the same row of P0
+
+    Arguments:
+      - fit_function(x, p) broadcasting over stacked parameters, with a
+        .jacobian (see above)
+      - x values shared by all windows
+      - Y: data, one row per window
+      - P0: initial parameters, one row per window
+      - bounds: optional lower and upper parameter limits; parameters
+        held at a limit by the gradient are kept fixed for the step and
+        the others are clipped to the limits
+        (see spectra_fitting_tools.peak_bounds)
+      - max_iter: iterations before a window is given up
+      - initial_damping: starting Marquardt damping; small, so the first
+        step is close to a Gauss-Newton step as in leastsq. A step that
+        lowers the sum of squares as predicted lowers it (by up to 10x),
+        a poor one raises it (by up to 2x) and a rejected step by 10x
+      - ftol/xtol: relative reduction of the sum of squares / relative
+        step size at which a window has converged (as in leastsq), once
+        its damping is back to 1 or less
+
+    Returns:
+      - fit parameters, one row per window
+      - fit errors, from the jacobian at the solution scaled by the
+        (fit - data) variance
+      - number of iterations of each window
+      - mask of the windows that converged
+    '''
+    x = np.asarray(x, dtype=float)
+    Y = np.asarray(Y, dtype=float).reshape(-1, len(x))
+    P = np.array(P0, dtype=float, ndmin=2)
+    nwindows, npars = P.shape
+    if bounds is None:
+        lower, upper = np.full(npars, -np.inf), np.full(npars, np.inf)
+    else:
+        lower, upper = np.asarray(bounds[0], float), np.asarray(bounds[1], float)
+    P = np.clip(np.nan_to_num(P), lower, upper)
+    jacobian = fit_function.jacobian
+    diagonal = np.arange(npars)
+
+    residuals = _evaluate(fit_function, x, P) - Y
+    cost = (residuals**2).sum(axis=1)
+    damping = np.full(nwindows, initial_damping)
+    niter = np.zeros(nwindows, dtype=int)
+    converged = np.zeros(nwindows, dtype=bool)
+    active = np.flatnonzero(np.isfinite(cost))
+    for iteration in range(max_iter):
+        if len(active) == 0:
+            break
+        Pa = P[active]
+        J = jacobian(x, Pa.T[:,:,None])
+        # batched matrix products, several times faster than einsum here
+        JTJ = np.matmul(J.transpose(0,2,1), J)
+        grad = np.matmul(residuals[active][:,None,:], J)[:,0]
+        # parameters on a bound the gradient pushes against stay there
+        fixed = ((Pa <= lower) & (grad > 0)) | ((Pa >= upper) & (grad < 0))
+        free = ~fixed
+        JTJ *= free[:,:,None] & free[:,None,:]
+        grad[fixed] = 0
+        # Marquardt scaling by the diagonal, floored for unused parameters
+        scale = JTJ[:,diagonal,diagonal]
+        scale = np.maximum(scale, 1e-12*scale.max(axis=1)[:,None] + 1e-300)
+        JTJ[:,diagonal,diagonal] += damping[active][:,None]*scale
+        Pnew = np.clip(Pa - _solve(JTJ, grad), lower, upper)
+        # drop of the sum of squares the linearized model predicts
+        h = Pnew - Pa
+        predicted = -2*(h*grad).sum(axis=1) - \
+            np.einsum('ki,kij,kj->k', h, JTJ, h) + \
+            damping[active]*(scale*h**2).sum(axis=1)
+
+        new_residuals = _evaluate(fit_function, x, Pnew) - Y[active]
+        new_cost = (new_residuals**2).sum(axis=1)
+        old_cost = cost[active]
+        better = new_cost < old_cost
+        # step and parameter sizes weighted by the jacobian column norms
+        step = np.sqrt((scale*(Pnew - Pa)**2).sum(axis=1))
+        size = np.sqrt((scale*Pa**2).sum(axis=1))
+        # a tiny drop or step held back by heavy damping is not a minimum:
+        # it is what a window stuck behind a dead exponential looks like
+        done = better & (damping[active] <= 1) & \
+            ((old_cost - new_cost <= ftol*old_cost) |
+             (step <= xtol*(size + xtol)))
+        # exact fit, or no step lowers the sum of squares any more (a
+        # plateau rather than a minimum, left unconverged)
+        exact = old_cost == 0
+        stuck = ~better & (damping[active] > 1e16)
+
+        moved = active[better]
+        P[moved] = Pnew[better]
+        residuals[moved] = new_residuals[better]
+        cost[moved] = new_cost[better]
+        ratio = (old_cost - new_cost)[better]/np.maximum(predicted[better], 1e-300)
+        damping[moved] = np.maximum(
+            damping[moved]*np.maximum(0.1, 1 - (2*ratio - 1)**3), 1e-15)
+        damping[active[~better]] *= 10
+        niter[active] += 1
+        converged[active[done | exact]] = True
+        active = active[~(done | exact | stuck)]
+
+    errors = np.zeros_like(P)
+    finite = np.flatnonzero(np.isfinite(cost))
+    if len(x) > npars and len(finite) > 0:
+        J = jacobian(x, P[finite].T[:,:,None])
+        s_sq = cost[finite]/(len(x) - npars)
+        pcov = np.linalg.pinv(np.matmul(J.transpose(0,2,1), J))*s_sq[:,None,None]
+        errors[finite] = np.absolute(pcov[:,diagonal,diagonal])**0.5
+    return P, errors, niter, converged
@@ -0,0 +1,439 @@
+'''
+Timing comparisons for the D3S analysis tools.
+
+Run from this directory:
+    python benchmarks.py
+'''
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from datetime import datetime
+from datetime import timedelta
+from dateutil.parser import parse
+
+import spectra_io
+import spectra_pyramid
+import spectra_windows
+import time_buckets
+import time_index
+
+def make_time_strings(nrows, step=300, tz='-07:00'):
+    '''
+    Make nrows D3S style time strings, step seconds apart
+    '''
+    start = datetime(2017, 1, 1)
+    return ['{:%Y-%m-%d %H:%M:%S}{}'.format(start + timedelta(seconds=step*i), tz)
+            for i in range(nrows)]
+
+def timed(func, *args):
+    t0 = time.time()
+    result = func(*args)
+    return time.time() - t0, result
+
+def benchmark_time_parsing(nrows=100000, nwindows=24):
+    '''
+    Per-row dateutil parse and compare vs. bulk parse and searchsorted
+      - selects nwindows hourly windows out of nrows timestamps
+    '''
+    strings = make_time_strings(nrows)
+    tstart = parse(strings[nrows//2])
+    edges = [tstart + timedelta(hours=i) for i in range(nwindows+1)]
+
+    def per_row(edges):
+        counts = []
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            counts.append(sum(1 for s in strings if lo < parse(s) < hi))
+        return counts
+
+    def bulk(edges):
+        times, datatz = time_index.parse_times(strings)
+        counts = []
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            window = time_index.window_slice(times, lo, hi)
+            counts.append(window.stop - window.start)
+        return counts
+
+    # the per-row version is far too slow to run in full, time one window
+    t_row, counts_row = timed(per_row, edges[:2])
+    t_row *= nwindows
+    t_bulk, counts_bulk = timed(bulk, edges)
+    assert counts_row[0] == counts_bulk[0]
+    print('time parsing, {} rows, {} windows:'.format(nrows, nwindows))
+    print('  dateutil per row : {:8.3f} s (extrapolated from 1 window)'.format(t_row))
+    print('  bulk/searchsorted: {:8.3f} s ({:.0f}x)'.format(t_bulk, t_row/t_bulk))
+
+def make_d3s_csv(path, nrows, step=300, nchannels=spectra_io.NCHANNELS):
+    '''
+    Write a D3S style csv with nrows rows of random counts, step seconds apart
+    '''
+    header = ['id', 'deviceTime_local'] + ['c{}'.format(i) for i in range(10)]
+    header += ['ch{}'.format(i) for i in range(nchannels)]
+    counts = np.random.poisson(1.0, size=(256, nchannels))
+    with open(path, 'w') as f:
+        f.write(','.join(header) + '\n')
+        for i, t in enumerate(make_time_strings(nrows, step)):
+            f.write('{},{},{},{}\n'.format(i, t, ','.join(['0']*10),
+                                           ','.join(map(str, counts[i % 256]))))
+
+def benchmark_window_pushdown(nrows=50000, ndays=7):
+    '''
+    Reading a whole csv and cutting a window vs. pushing the window down
+      - nrows 5 minute rows, window of ndays in the middle of the file
+    '''
+    path = os.path.join(tempfile.mkdtemp(), 'd3s.csv')
+    make_d3s_csv(path, nrows)
+    strings = make_time_strings(nrows)
+    start = parse(strings[nrows//2]).replace(tzinfo=None)
+    stop = start + timedelta(days=ndays)
+
+    def full():
+        times, spectra, datatz = spectra_io.read_spectra(path)
+        window = time_index.window_slice(times, start.replace(tzinfo=datatz),
+                                         stop.replace(tzinfo=datatz))
+        return window.stop - window.start
+
+    def pushdown():
+        times, spectra, datatz = spectra_io.read_spectra(path, start=start,
+                                                         stop=stop)
+        window = time_index.window_slice(times, start.replace(tzinfo=datatz),
+                                         stop.replace(tzinfo=datatz))
+        return window.stop - window.start
+
+    t_full, n_full = timed(full)
+    t_push, n_push = timed(pushdown)
+    assert n_full == n_push
+    size = os.path.getsize(path)
+    offset = spectra_io.seek_time(path, '{:%Y-%m-%d %H:%M:%S}'.format(
+        start - spectra_io.PUSHDOWN_MARGIN))
+    os.remove(path)
+    print('{} day window out of {} rows ({:.0f} MB):'.format(
+        ndays, nrows, size/1e6))
+    print('  full read : {:8.3f} s'.format(t_full))
+    print('  pushdown  : {:8.3f} s ({:.0f}x), reading from byte {} on'.format(
+        t_push, t_full/t_push, offset))
+
+def benchmark_compression(nrows=5000):
+    '''
+    Reading the same spectra from a plain csv / archive and from copies
+    compressed with each codec in spectra_io.COMPRESSED_FORMATS
+      - MB/s are of uncompressed data, ratio is uncompressed/compressed size
+    '''
+    tmpdir = tempfile.mkdtemp()
+    csv_path = os.path.join(tmpdir, 'd3s.csv')
+    make_d3s_csv(csv_path, nrows)
+    times, spectra, datatz = spectra_io.read_spectra(csv_path)
+    archive_path = os.path.join(tmpdir, 'd3s.d3s')
+    spectra_io.write_archive(archive_path, times, spectra, datatz)
+    extensions = dict((codec, ext) for ext, codec in
+                      spectra_io.COMPRESSED_EXTENSIONS.items())
+
+    print('reading {} spectra:'.format(nrows))
+    for kind, path, read in [('csv', csv_path, spectra_io.read_spectra),
+                             ('archive', archive_path, spectra_io.open_archive)]:
+        size = os.path.getsize(path)
+        paths = [('none', path)]
+        for prefix, codec in spectra_io.COMPRESSED_FORMATS:
+            compressed = path + extensions[codec]
+            if kind == 'archive':
+                spectra_io.write_archive(compressed, times, spectra, datatz)
+            else:
+                with open(path, 'rb') as f_in, \
+                     codec.open(compressed, 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+            paths.append((codec.__name__, compressed))
+        for name, compressed in paths:
+            t, result = timed(read, compressed)
+            # touch every count so the mapped archive is really read
+            assert result[1].sum() == spectra.sum()
+            print('  {:>7} {:>5}: {:7.3f} s, {:7.1f} MB/s, ratio {:5.1f}'.format(
+                kind, name, t, size/1e6/t,
+                size/float(os.path.getsize(compressed))))
+    shutil.rmtree(tmpdir)
+
+def benchmark_window_integration(ndays=30, nhours=1, step=300):
+    '''
+    Integrating nhours windows over ndays of 5 minute spectra
+      - window loop: a datetime step, window_slice and sum per window
+      - block sums: vectorized edges, one searchsorted, a sum per window
+      - window_spectra: vectorized edges, one searchsorted, np.add.reduceat
+        over blocks of rows (see spectra_windows.integrate_rows)
+    '''
+    nrows = ndays*86400//step
+    times = 1483228800 + step*np.arange(nrows, dtype=np.int64)
+    spectra = np.random.poisson(1.0, size=(nrows, spectra_io.NCHANNELS))
+    spectra = spectra.astype(np.uint32)
+    tstart = time_index.from_epoch(times[0] - 1)
+    tstop = tstart + timedelta(days=ndays)
+
+    def window_loop():
+        integrated = []
+        time_itr = tstart
+        while time_itr < tstop:
+            time_next = time_itr + timedelta(hours=nhours)
+            window = time_index.window_slice(times, time_itr, time_next)
+            if window.stop > window.start:
+                integrated.append(spectra[window].sum(axis=0))
+            time_itr = time_next
+        return np.array(integrated)
+
+    def block_sums():
+        starts, stops = time_buckets.day_windows(tstart, tstop, nhours)
+        first, last = time_index.window_rows(times, starts, stops)
+        full = last > first
+        return np.array([spectra[a:b].sum(axis=0, dtype=np.uint64)
+                         for a, b in zip(first[full], last[full])])
+
+    t_loop, loop = timed(window_loop)
+    t_blocks, summed = timed(block_sums)
+    t_engine, (window_times, integrated) = timed(
+        spectra_windows.window_spectra, times, spectra, nhours, tstart, tstop)
+    assert np.array_equal(loop, integrated)
+    assert np.array_equal(summed, integrated)
+    print('{} hour windows over {} days ({} rows):'.format(nhours, ndays, nrows))
+    print('  window loop   : {:8.3f} s'.format(t_loop))
+    print('  block sums    : {:8.3f} s'.format(t_blocks))
+    print('  window_spectra: {:8.3f} s'.format(t_engine))
+
+def benchmark_prefix_index(ndays=60, step=300, nhours_list=(1, 2, 4, 24)):
+    '''
+    Rebuilding nhours time series from the spectra vs. from the prefix sums
+      - the index is built once, every series after that is two row
+        lookups per window
+    '''
+    nrows = ndays*86400//step
+    times = 1483228800 + step*np.arange(nrows, dtype=np.int64)
+    spectra = np.random.poisson(1.0, size=(nrows, spectra_io.NCHANNELS))
+    spectra = spectra.astype(np.uint32)
+    tstart = time_index.from_epoch(times[0] - 1)
+    tstop = tstart + timedelta(days=ndays)
+
+    t_build, prefix = timed(spectra_windows.prefix_sums, spectra)
+    print('{} days of spectra ({} rows), index built in {:.3f} s:'.format(
+        ndays, nrows, t_build))
+    for nhours in nhours_list:
+        t_sum, (window_times, summed) = timed(spectra_windows.window_spectra,
+            times, spectra, nhours, tstart, tstop)
+        t_prefix, (window_times, indexed) = timed(
+            spectra_windows.window_spectra, times, spectra, nhours, tstart,
+            tstop, prefix)
+        assert np.array_equal(summed, indexed)
+        print('  {:>2} hour windows: sums {:.4f} s, index {:.4f} s'.format(
+            nhours, t_sum, t_prefix))
+
+def benchmark_pyramid(ndays=90, step=300):
+    '''
+    Daily and weekly spectra summed from the raw rows vs. read from the
+    spectrum pyramid (built once beforehand)
+    '''
+    nrows = ndays*86400//step
+    times = 1483228800 + step*np.arange(nrows, dtype=np.int64)
+    spectra = np.random.poisson(1.0, size=(nrows, spectra_io.NCHANNELS))
+    spectra = spectra.astype(np.uint32)
+
+    t_build, pyramid = timed(spectra_pyramid.build_pyramid, times, spectra,
+                             time_index.utc)
+    print('{} days of spectra ({} rows), pyramid built in {:.3f} s:'.format(
+        ndays, nrows, t_build))
+    for name, width in spectra_pyramid.LEVELS[1:]:
+        starts = pyramid['origin'] + \
+            (times[0] - pyramid['origin'])//width*width
+        starts += width*np.arange(-(-(times[-1] + 1 - starts)//width))
+        first = np.searchsorted(times, starts, side='left')
+        last = np.searchsorted(times, starts + width, side='left')
+        t_raw, summed = timed(spectra_windows.integrate_rows, spectra,
+                              first, last)
+        t_pyramid, (window_starts, read, counts) = timed(
+            spectra_pyramid.pyramid_windows, pyramid, None, None, width)
+        assert np.array_equal(summed, read)
+        print('  {:>4} spectra: raw rows {:.4f} s, pyramid {:.4f} s'.format(
+            name, t_raw, t_pyramid))
+
+def benchmark_rolling(ndays=30, nhours=4, step_minutes=30, step=300):
+    '''
+    Overlapping windows summed from scratch vs. the rolling add/subtract
+    integrator (spectra_windows.rolling_spectra)
+    '''
+    nrows = ndays*86400//step
+    times = 1483228800 + step*np.arange(nrows, dtype=np.int64)
+    spectra = np.random.poisson(1.0, size=(nrows, spectra_io.NCHANNELS))
+    spectra = spectra.astype(np.uint32)
+    tstart = time_index.from_epoch(times[0] - 1)
+    tstop = tstart + timedelta(days=ndays)
+
+    def from_scratch():
+        width = nhours*3600
+        starts = time_index.to_epoch(tstart) + step_minutes*60*np.arange(
+            (ndays*86400 - width)//(step_minutes*60) + 1)
+        first, last = time_index.window_rows(times, starts, starts + width)
+        return spectra_windows.integrate_rows(spectra, first, last)
+
+    def rolling():
+        return np.array([counts for window_time, counts, live_time in
+                         spectra_windows.rolling_spectra(times, spectra, nhours,
+                             step_minutes, tstart, tstop)])
+
+    t_scratch, summed = timed(from_scratch)
+    t_rolling, rolled = timed(rolling)
+    assert np.array_equal(summed, rolled)
+    print('{} hour windows every {} minutes over {} days:'.format(
+        nhours, step_minutes, ndays))
+    print('  from scratch: {:8.3f} s'.format(t_scratch))
+    print('  rolling     : {:8.3f} s'.format(t_rolling))
+
+def benchmark_stations(nstations=20, ndays=30, nhours=1, step=300):
+    '''
+    Integrating nstations over the same nhours windows
+      - per station: window_spectra once for each station
+      - station_spectra: one shared window grid for all stations, with
+        and without prefix sums
+    '''
+    nrows = ndays*86400//step
+    times = 1483228800 + step*np.arange(nrows, dtype=np.int64)
+    spectra = np.random.poisson(1.0, size=(nrows, spectra_io.NCHANNELS))
+    spectra = spectra.astype(np.uint32)
+    # stations offset by a few minutes, as their clocks are
+    stations = [(times + 60*(i % 5), spectra) for i in range(nstations)]
+    tstart = time_index.from_epoch(times[0] - 1)
+    tstop = tstart + timedelta(days=ndays)
+
+    def per_station():
+        return [spectra_windows.window_spectra(t, s, nhours, tstart, tstop)[1]
+                for t, s in stations]
+
+    prefix = spectra_windows.prefix_sums(spectra)
+    t_loop, loop = timed(per_station)
+    t_tensor, (starts, stops, tensor, counts) = timed(
+        spectra_windows.station_spectra, stations, nhours, tstart, tstop)
+    t_prefix, (starts, stops, from_prefix, counts) = timed(
+        spectra_windows.station_spectra, stations, nhours, tstart, tstop,
+        [prefix]*nstations)
+    for i in range(nstations):
+        assert np.array_equal(loop[i], tensor[i][counts[i] > 0])
+    assert np.array_equal(tensor, from_prefix)
+    print('{} stations, {} hour windows over {} days ({} rows each):'.format(
+        nstations, nhours, ndays, nrows))
+    print('  per station      : {:8.3f} s'.format(t_loop))
+    print('  station_spectra  : {:8.3f} s'.format(t_tensor))
+    print('  with prefix sums : {:8.3f} s'.format(t_prefix))
+
+def benchmark_fit_jacobian(nfits=200, lower=540, upper=640, seed=0):
+    '''
+    spectra_fitting_tools.peak_fitter on hourly spectra with finite
+    differences vs. the closed-form jacobian of each fit function
+      - each model fits poisson spectra drawn from itself
+      - the finite difference fits are given the model without a
+        jacobian attribute, the others with its *_jacobian function
+      - per model: wall time of all fits and per fit, median nfev (fit
+        function calls) and njev (jacobian calls) per fit
+      - "default" marks the models peak_fitter fits with their jacobian
+    '''
+    # imported here: spectra_fitting_tools needs scipy and matplotlib
+    import spectra_fitting_tools as fitting
+
+    rng = np.random.RandomState(seed)
+    points = np.arange(lower, upper, dtype=float)
+    mean = (lower + upper)/2.0
+    slope = lambda c: 2*(np.log(c[-1]) - np.log(c[0]))/(points[-1] - points[0])
+    # model, its jacobian, true parameters, initial parameters (as in
+    # peak_seeds)
+    models = (
+        (fitting.gaus_plus_exp, fitting.gaus_plus_exp_jacobian,
+         [40, 590, 12, 3000, -0.008],
+         lambda c: [c[0], mean, 5.0, c[0]*100, slope(c)]),
+        (fitting.double_gaus_plus_exp, fitting.double_gaus_plus_exp_jacobian,
+         [30, 580, 8, 25, 605, 8, 3000, -0.008],
+         lambda c: [c[0]/5.0, mean - 2, 5.0, c[0]/5.0, mean + 2, 5.0, c[0],
+                    slope(c)]),
+        (fitting.gaus_plus_line, fitting.gaus_plus_line_jacobian,
+         [40, 590, 12, -0.05, 60],
+         lambda c: [c.max() - c.min(), mean, 5.0, 0.0, c.min()]),
+        (fitting.double_gaus_plus_line, fitting.double_gaus_plus_line_jacobian,
+         [30, 580, 8, 25, 605, 8, -0.05, 60],
+         lambda c: [(c.max() - c.min())/2, mean - 10, 5.0,
+                    (c.max() - c.min())/2, mean + 10, 5.0, 0.0, c.min()]),
+    )
+
+    print('{} hourly fits, channels {}-{}:'.format(nfits, lower, upper))
+    for model, jacobian, ptrue, pinit in models:
+        spectra = rng.poisson(model(points, ptrue),
+                              size=(nfits, len(points))).astype(float)
+        finite_diff = lambda x, p: model(x, p)
+        with_jacobian = lambda x, p: model(x, p)
+        with_jacobian.jacobian = jacobian
+        results = []
+        for fit_function in (finite_diff, with_jacobian):
+            nfev = []
+            njev = []
+            chi2 = []
+            t0 = time.time()
+            for counts in spectra:
+                info = {}
+                pfit, perr = fitting.peak_fitter(points, counts, fit_function,
+                                                 pinit(counts), info)
+                nfev.append(info['nfev'])
+                njev.append(info['njev'])
+                chi2.append(((model(points, pfit) - counts)**2).sum())
+            results.append((time.time() - t0, nfev, njev, np.array(chi2)))
+        (t_fd, nfev_fd, njev_fd, chi2_fd), \
+            (t_jac, nfev_jac, njev_jac, chi2_jac) = results
+        # the fits agree, or the jacobian fit found the better minimum
+        as_good = np.mean(chi2_jac <= chi2_fd*(1 + 1e-4))
+        print('  {:<21} {:>7}: finite diff {:6.2f} s ({:6.2f} ms), '
+              'nfev {:4.0f} | jacobian {:6.2f} s ({:6.2f} ms), nfev {:4.0f}, '
+              'njev {:4.0f} | chi2 as good {:.0%}'.format(
+                  model.__name__,
+                  'default' if hasattr(model, 'jacobian') else '',
+                  t_fd, 1e3*t_fd/nfits, np.median(nfev_fd),
+                  t_jac, 1e3*t_jac/nfits, np.median(nfev_jac),
+                  np.median(njev_jac), as_good))
+
+def benchmark_batch_fit(nfits=720, lower=540, upper=640, seed=0):
+    '''
+    single_peak_fit.batch (one batch_leastsq call over nfits windows, see
+    spectra_fitting_tools.batch_peak_fit) against one single_peak_fit per
+    window, on spectra drawn from pure_gaus_plus_exp
+      - serial leastsq: the default backend, the one to beat
+      - serial bounded: the same model and limits as the batch
+      - the speedup and the |mean difference| of the batch to each
+    '''
+    # imported here: spectra_fitting_tools needs scipy and matplotlib
+    import spectra_fitting_tools as fitting
+
+    rng = np.random.RandomState(seed)
+    channels = np.arange(spectra_io.NCHANNELS, dtype=float)
+    spectra = rng.poisson(fitting.pure_gaus_plus_exp(channels,
+                                                     [40, 590, 6, 3000, -0.008]),
+                          size=(nfits, len(channels)))
+
+    serial = []
+    for backend in ('leastsq', 'bounded'):
+        t0 = time.time()
+        fit_means = [fitting.single_peak_fit(spectrum, lower, upper,
+                                             backend=backend)[0][0]
+                     for spectrum in spectra]
+        serial.append((backend, time.time() - t0, np.array(fit_means)))
+    t_batch, (means, sigmas, amps) = timed( \
+        fitting.single_peak_fit.batch, spectra, lower, upper)
+    means = np.array([mean[0] for mean in means])
+    print('{} fits, channels {}-{}: batch {:.3f} s'.format(nfits, lower, upper,
+                                                           t_batch))
+    for backend, t_serial, fit_means in serial:
+        difference = np.abs(means - fit_means)
+        print('  serial {:<7}: {:6.2f} s, batch {:4.1f}x faster, '
+              '|mean difference| median {:.2g}, max {:.2g}'.format(
+                  backend, t_serial, t_serial/t_batch,
+                  np.median(difference), difference.max()))
+
+if __name__ == '__main__':
+    benchmark_time_parsing()
+    benchmark_window_pushdown()
+    benchmark_compression()
+    benchmark_window_integration()
+    benchmark_prefix_index()
+    benchmark_pyramid()
+    benchmark_rolling()
+    benchmark_stations()
+    benchmark_fit_jacobian()
+    benchmark_batch_fit()
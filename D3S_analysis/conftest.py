@@ -0,0 +1,5 @@
+# the tests import the modules by name, as the scripts in this directory do
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,70 @@
+'''
+Window fits spread over a pool of worker processes.
+
+The integrated spectra are copied once into shared memory (see
+shared_arrays) and every worker attaches to the block when it starts, so
+a task only names the window to fit:
+    fits = parallel_fits.map_windows(peak_finder, windows, \
+        (lower_limit, upper_limit, count_offset), workers=4)
+
+Each worker calls the fit function on an exact copy of the window, so the
+results equal those of the serial loop, and they come back in window
+(time) order. Workers plot with the non-interactive Agg backend: saved
+plots are written as usual and nothing is shown on screen.
+'''
+import numpy as np
+from multiprocessing import Pool
+import shared_arrays
+
+_shm = None
+_windows = None
+
+def _init_worker(descriptor):
+    # set before any plot is made in this process
+    import matplotlib
+    matplotlib.use('Agg')
+    global _shm, _windows
+    _shm, _windows = shared_arrays.attach_array(descriptor)
+
+def _fit_window(task):
+    fit_function, index, with_counter, fit_args, fit_kwargs = task
+    counts = np.array(_windows[index])
+    if with_counter:
+        return fit_function(counts, *fit_args, counter=index, **fit_kwargs)
+    return fit_function(counts, *fit_args, **fit_kwargs)
+
+def map_windows(fit_function, windows, fit_args=(), workers=2, with_counter=False,
+                fit_kwargs=None):
+    '''
+    Fit every window in a process pool
+
+    Arguments:
+      - fit_function: module level (picklable) function called as
+        fit_function(counts, *fit_args, **fit_kwargs), or
+        fit_function(counts, *fit_args, counter=index, **fit_kwargs)
+        with with_counter
+      - windows: integrated spectra, one row per window
+      - fit_args: further arguments, the same for every window
+      - workers: number of processes
+      - with_counter: pass the window index as counter (used to name
+        the plots, see spectra_fitting_tools.single_peak_fit)
+      - fit_kwargs: optional keyword arguments, the same for every window
+        (e.g. the fit backend, see spectra_fitting_tools.get_peaks)
+
+    Returns:
+      - list of the fit_function results, in window order
+    '''
+    windows = np.asarray(windows)
+    if len(windows) == 0:
+        return []
+    shm, shared = shared_arrays.share_array(windows)
+    try:
+        descriptor = shared_arrays.describe(shm, shared)
+        tasks = [(fit_function, i, with_counter, tuple(fit_args),
+                  dict(fit_kwargs or {}))
+                 for i in range(len(windows))]
+        with Pool(workers, _init_worker, (descriptor,)) as pool:
+            return pool.map(_fit_window, tasks)
+    finally:
+        del shared
+        shared_arrays.release(shm)
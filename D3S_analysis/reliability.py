@@ -0,0 +1,93 @@
+'''
+Gap and live-time accounting for D3S data.
+
+Rows are nominally row_seconds apart (300 s for the D3S). Intervals far
+from that are listed in a gap table, and every integration window gets a
+live time (rows x row_seconds) and a coverage fraction (live time over
+window length), so windows missing data can be normalized or skipped
+before they are fitted.
+'''
+import numpy as np
+
+try:
+    from . import time_index
+except ImportError:
+    # run from this directory rather than as the D3S_analysis package
+    import time_index
+
+ROW_SECONDS = 300
+# intervals outside these bounds are reported (see tools.check_data_reliability)
+MIN_INTERVAL = 290
+MAX_INTERVAL = 310
+
+GAP_DTYPE = np.dtype([
+    ('start', np.int64),
+    ('stop', np.int64),
+    ('seconds', np.int64),
+    ('missing_rows', np.int64),
+    ('kind', 'U5'),
+])
+
+def row_seconds(times):
+    '''
+    Time covered by one row: the median spacing of the times
+    '''
+    if len(times) < 2:
+        return ROW_SECONDS
+    return int(np.median(np.diff(times)))
+
+def gap_table(times, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+              interval=ROW_SECONDS):
+    '''
+    Table of the intervals between rows that are too short or too long
+
+    Arguments:
+      - sorted UTC epoch times
+      - shortest and longest acceptable interval (s)
+      - nominal interval (s), to count the rows missing in a long gap
+
+    Returns:
+      - structured array with fields start, stop (epoch s), seconds,
+        missing_rows and kind ('short' or 'long'), in time order
+    '''
+    times = np.asarray(times, dtype=np.int64)
+    dt = np.diff(times)
+    irregular = np.flatnonzero((dt < min_interval) | (dt > max_interval))
+    gaps = np.zeros(len(irregular), dtype=GAP_DTYPE)
+    gaps['start'] = times[irregular]
+    gaps['stop'] = times[irregular + 1]
+    gaps['seconds'] = dt[irregular]
+    gaps['missing_rows'] = np.maximum(
+        np.round(dt[irregular]/float(interval)).astype(np.int64) - 1, 0)
+    gaps['kind'] = np.where(dt[irregular] < min_interval, 'short', 'long')
+    return gaps
+
+def window_coverage(first, last, starts, stops, interval=ROW_SECONDS):
+    '''
+    Live time and coverage of integration windows
+
+    Arguments:
+      - first row and row past the end of each window
+        (see time_index.window_rows)
+      - window start/stop (epoch s)
+      - time covered by one row (s)
+
+    Returns:
+      - live time of each window (s)
+      - fraction of each window covered by data, at most 1
+    '''
+    live_time = (np.asarray(last) - np.asarray(first))*interval
+    length = np.asarray(stops) - np.asarray(starts)
+    coverage = np.minimum(live_time/np.maximum(length, 1).astype(float), 1.0)
+    return live_time, coverage
+
+def print_gaps(gaps, tzinfo=None):
+    '''
+    Print a gap table, one line per irregular interval
+    '''
+    for gap in gaps:
+        print('Too {}: {} to {} ({} s)'.format(
+            gap['kind'],
+            time_index.from_epoch(gap['start'], tzinfo),
+            time_index.from_epoch(gap['stop'], tzinfo),
+            gap['seconds']))
@@ -0,0 +1,73 @@
+'''
+Numpy arrays in shared memory, to hand integrated spectra to worker
+processes without pickling them.
+
+The parent creates the array and passes its (small) descriptor to the
+workers, which attach to the same memory by name:
+    shm, tensor = shared_arrays.create_array((nstations, nwindows, 1024))
+    spectra_windows.station_spectra(stations, 4, tstart, tstop, out=tensor)
+    ... pool.map(fit_station, [(shared_arrays.describe(shm, tensor), i)
+                               for i in range(nstations)]) ...
+    del tensor
+    shared_arrays.release(shm)
+
+and in a worker:
+    shm, tensor = shared_arrays.attach_array(descriptor)
+    counts = np.array(tensor[i])
+    del tensor
+    shm.close()
+
+A block cannot be closed while arrays backed by it are still alive.
+'''
+import numpy as np
+from multiprocessing import shared_memory
+
+def create_array(shape, dtype=np.uint64):
+    '''
+    Allocate a zeroed array in a new shared memory block
+
+    Returns:
+      - the SharedMemory block (keep it alive while the array is used)
+      - numpy array backed by the block
+    '''
+    dtype = np.dtype(dtype)
+    size = max(int(np.prod(shape))*dtype.itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    array[...] = 0
+    return shm, array
+
+def share_array(values):
+    '''
+    Copy an array into a new shared memory block (see create_array)
+    '''
+    shm, array = create_array(values.shape, values.dtype)
+    array[...] = values
+    return shm, array
+
+def describe(shm, array):
+    '''
+    Picklable descriptor of a shared array: block name, shape and dtype
+    '''
+    return {'name': shm.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+def attach_array(descriptor):
+    '''
+    Map a shared array from its descriptor, in another process
+
+    Returns:
+      - the SharedMemory block (close it when done)
+      - numpy array backed by the block
+    '''
+    shm = shared_memory.SharedMemory(name=descriptor['name'])
+    array = np.ndarray(descriptor['shape'], dtype=np.dtype(descriptor['dtype']),
+                       buffer=shm.buf)
+    return shm, array
+
+def release(shm):
+    '''
+    Close and free a shared memory block created by this process, once
+    the arrays backed by it are gone
+    '''
+    shm.close()
+    shm.unlink()
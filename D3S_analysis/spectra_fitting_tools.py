@@ -1,536 +1,776 @@
-import numpy as np
-from scipy import optimize
-from scipy import asarray as ar,exp
-from scipy.integrate import quad
-
-import matplotlib.pyplot as plt
-
-verbose = 0
-#--------------------------------------------------------------------------#
-# Fit Functions
-#--------------------------------------------------------------------------#
-def lbound(bound,par):
-    return 1e4*np.sqrt(bound-par) + 1e-3*(bound-par) if (par<bound) else 0
-
-def ubound(bound,par):
-    return 1e4*np.sqrt(par-bound) + 1e-3*(par-bound) if (par>bound) else 0
-
-def bound(bounds,par):
-    return lbound(bounds[0],par) + ubound(bounds[1],par)
-
-def fixed(fix,par):
-    return bound((fix,fix), par)
-
-def gaus(x,a,x0,sigma):
-    return a*exp(-(x-x0)**2/(2*sigma**2))+lbound(0,a)+bound([0,7],sigma)+lbound(0,x0)
-
-def expo(x,a,slope):
-    return a*exp(x*slope)+lbound(0,a)+ubound(0,slope)
-
-# p = [a1,mean,sigma,a2,shift,slope,const]
-def gaus_plus_exp(x,p):
-    return gaus(x,p[0],p[1],p[2])+expo(x,p[3],p[4])
-
-# p = [a1,mean,sigma,slope,const]
-def gaus_plus_line(x,p):
-    return gaus(x,p[0],p[1],p[2])+p[3]*x+p[4]
-
-def double_gaus_plus_exp(x,p):
-    return gaus(x,p[0],p[1],p[2])+gaus(x,p[3],p[4],p[5])+expo(x,p[6],p[7])
-
-def double_gaus_plus_line(x,p):
-    return gaus(x,p[0],p[1],p[2])+gaus(x,p[3],p[4],p[5])+p[6]*x+p[7]
-
-def peak_fitter(x,y,fit_function,pinit): 
-    """
-    Peak Finder for peak in specified range
-
-    Args:
-        x: data x values for fitting
-        y: data y values for fitting
-        fit_function: fit function
-        pinit: inital parameters for fit function
-
-    Returns:
-        array of resulting fit parameters and array of fit errors
-    """
-    errfunc = lambda p, x, y: fit_function(x,p) - y 
-    pfit,pcov,infodict,errmsg,success = \
-        optimize.leastsq(errfunc, pinit, args=(x,y), \
-            full_output=1, epsfcn=0.0001)
-
-    if (len(y) > len(pinit)) and pcov is not None:
-        s_sq = (errfunc(pfit, x, y)**2).sum()/(len(y)-len(pinit))
-        pcov = pcov * s_sq
-    else:
-        pcov = 0
-
-    error = [] 
-    for i in range(len(pfit)):
-        try:
-          error.append(np.absolute(pcov[i][i])**0.5)
-        except:
-          error.append( 0.00 )
-    pfit_leastsq = pfit
-    perr_leastsq = np.array(error) 
-    return pfit_leastsq, perr_leastsq 
-
-def single_peak_fit(array,counter,lower,upper,count_offset=1,make_plot=False,plot_name=''):
-    """
-    Performs single gaussian + exponential background fit
-
-    Args:
-        array: full array of counts (spectra)
-        lower,upper: bounds on spectra for window to fit inside
-        count_offset: correction for shift from left edge of spectrum
-        make_plot: flag for plotting fit result (diagnostic)
-
-    Returns:
-        list of fit parameters+errors
-    """
-    points = ar(range(lower,upper))
-    counts = ar(list(array[lower:upper]))
-
-    nentries = len(points)
-    mean = lower + (upper - lower)/2.0
-    slope = (np.log(counts[-1])-np.log(counts[0]))/(points[-1]-points[0])
-    pinit = [counts[0],mean,5.0,counts[0]*count_offset,slope]
-    pars,errs = peak_fitter(points,counts,gaus_plus_exp,pinit)
-    if make_plot:
-        fig = plt.figure()
-        fig.patch.set_facecolor('white')
-        plt.title('Spectra integrated over a day')
-        plt.xlabel('channels')
-        plt.ylabel('counts')
-        plt.xlim(lower,upper)
-        #plt.ylim()
-        x = ar(range(0,len(array)))
-        plt.plot(x,array,'b:',label='data')
-        plt.plot(x,gaus_plus_exp(x,pars),'ro:',label='fit')
-        plt.legend()
-        plt.yscale('log')
-        fig_file = '/Users/alihanks/Google Drive/NQUAKE_analysis/D3S/fit_plots/'+plot_name+'_fit_'+str(counter)+'.pdf'
-        plt.savefig(fig_file)
-        plt.close()
-
-    if verbose:
-        par_labels = ['norm','mean','sigma','amp','slope']
-        for i in range(len(pars)):
-            print('{}-{}: {} +/- {}'.format(par_labels[i],counter,pars[i],errs[i]))
-
-    return [pars[1],errs[1]],[pars[2],errs[2]],[pars[0],errs[0]]
-
-def double_peak_fit(array,counter,lower,upper,pindex=0,count_offset=1,make_plot=False,plot_name=''):
-    """
-    Performs double gaussian + exponential background fit
-
-    Args:
-        array: full array of counts (spectra)
-        lower,upper: bounds on spectra for window to fit inside
-        pindex: indication of which gaussian to get fit results for
-        count_offset: correction for shift from left edge of spectrum
-        make_plot: flag for plotting fit result (diagnostic)
-
-    Returns:
-        list of fit parameters+errors
-    """
-    points = ar(range(lower,upper))
-    counts = ar(list(array[lower:upper]))
-
-    nentries = len(points)
-    mean = lower + (upper - lower)/2.0
-    slope = (np.log(counts[-1])-np.log(counts[0]))/(points[-1]-points[0])
-    pinit = [counts[0]/7.0,mean-5.0,3.0,counts[0]/7.0,mean+5.0,3.0, \
-             counts[0]*count_offset,slope]
-    pars,errs = peak_fitter(points,counts,double_gaus_plus_exp,pinit)
-    if verbose:
-        par_labels = ['norm1','mean1','sigma1','norm2','mean2','sigma2','amp','slope']
-        for i in range(len(pars)):
-            print('{}-{}: {} +/- {}'.format(par_labels[i],counter,pars[i],errs[i]))
-
-    if make_plot:
-        fig = plt.figure()
-        fig.patch.set_facecolor('white')
-        plt.title('Spectra integrated over a day')
-        plt.xlabel('channels')
-        plt.ylabel('counts')
-        plt.xlim(lower,upper)
-        plt.ylim(20,1000)
-        x = ar(range(0,len(array)))
-        plt.plot(x,array,'b:',label='data')
-        plt.plot(x,double_gaus_plus_exp(x,pars),'ro:',label='fit')
-        plt.legend()
-        plt.yscale('log')
-        fig_file = '/Users/alihanks/Google Drive/NQUAKE_analysis/D3S/fit_plots/'+plot_name+'_fit_'+str(counter)+'.pdf'
-        plt.savefig(fig_file)
-        plt.close()
-
-    mean = [pars[1],errs[1]]
-    sigma = [pars[2],errs[2]]
-    amp = [pars[0],errs[0]]
-    if (pindex==1 and pars[4] > pars[1]) or (pindex==0 and pars[4] < pars[1]):
-        mean = [pars[4],errs[4]]
-        sigma = [pars[5],errs[5]]
-        amp = [pars[3],errs[3]]
-        if errs[1] > errs[4]:
-            mean[1] = errs[1]
-        if abs(pars[2]-pars[5])/pars[2] > 0.8:
-            mean[1] = 150
-    return mean,sigma,amp
-
-def get_peak_counts(means,sigmas,amps):
-    '''
-    Calculate the area under a gaussian curve (estimate of counts in that peak)
-
-    Arguments:
-      - list of guassian means
-      - list of guassian widths
-      - list of gaussian amplitudes
-
-    Returns:
-      - list of counts from resulting gaussian integrations 
-    '''
-    counts = []
-    for i in range(len(means)):
-        count,err = quad(gaus,0,500,args=(amps[i],means[i],sigmas[i]))
-        counts.append(count)
-    return counts
-=======
-import numpy as np
-from scipy import optimize
-from scipy import asarray as ar,exp
-from scipy.integrate import quad
-
-import matplotlib.pyplot as plt
-
-from dateutil.parser import parse
-from datetime import datetime
-from datetime import timedelta
-
-verbose = 0
-
-
-
-def make_int(lst):
-    '''
-    Makes all entries of a list an integer
-    '''
-    y = []
-    for i in lst:
-        y.append(int(i))
-    return y
-
-def make_array(lst):
-    '''
-    Makes list into an array. Also splices out the irrelevant stuff
-    for a spectra
-    '''
-    y = np.asarray(make_int(lst[12:]))
-    return y
-
-def inTimeRange(time_string,tstart,tstop):
-    time = tstart - timedelta(minutes=1)
-    if isinstance(time_string, str):
-        try:
-            time = parse(time_string)
-        except:
-            print('{} Not a time!'.format(time_string))
-            return False
-    elif isinstance(time_string, datetime):
-        time = time_string
-
-    # check that tzinfo is set for tz aware comparisons
-    if tstart.tzinfo==None:
-        tstart = tstart.replace(tzinfo=time.tzinfo)
-    if tstop.tzinfo==None:
-        tstop = tstop.replace(tzinfo=time.tzinfo)
-    return (time > tstart and time < tstop)
-
-# -------------------------------------------------------------------------- #
-# Fit Functions
-# -------------------------------------------------------------------------- #
-
-def lbound(bound,par):
-    return 1e4*np.sqrt(bound-par) + 1e-3*(bound-par) if (par<bound) else 0
-
-def ubound(bound,par):
-    return 1e4*np.sqrt(par-bound) + 1e-3*(par-bound) if (par>bound) else 0
-
-# def bound(bounds,par):
-#     return lbound(bounds[0],par) + ubound(bounds[1],par)
-#
-# def fixed(fix,par):
-#     return bound((fix,fix), par)
-
-def gaus(x,a,x0,sigma):
-    return a*exp(-(x-x0)**2/(2*sigma**2))+lbound(0,a)+lbound(0,sigma)+lbound(0,x0)
-
-def expo(x,a,slope):
-    return a*exp(x*slope)
-
-# p = [a1,mean,sigma,a2,shift,slope,const]
-def gaus_plus_exp(x,p):
-    return gaus(x,p[0],p[1],p[2])+expo(x,p[3],p[4])
-
-# # p = [a1,mean,sigma,slope,const]
-# def gaus_plus_line(x,p):
-#     return gaus(x,p[0],p[1],p[2])+p[3]*x+p[4]
-
-def double_gaus_plus_exp(x,p):
-    return gaus(x,p[0],p[1],p[2])+gaus(x,p[3],p[4],p[5])+expo(x,p[6],p[7])
-
-# def double_gaus_plus_line(x,p):
-#     return gaus(x,p[0],p[1],p[2])+gaus(x,p[3],p[4],p[5])+p[6]*x+p[7]
-
-def peak_fitter(x,y,fit_function,pinit):
-    """
-    Peak Finder for peak in specified range
-
-    Args:
-        x: data x values for fitting
-        y: data y values for fitting
-        fit_function: fit function
-        pinit: initial parameters for fit function
-
-    Returns:
-        array of resulting fit parameters and array of fit errors
-    """
-    errfunc = lambda p, x, y: fit_function(x,p) - y
-    pfit,pcov,infodict,errmsg,success = \
-        optimize.leastsq(errfunc, pinit, args=(x,y), \
-            full_output=1, epsfcn=0.0001)
-
-    if (len(y) > len(pinit)) and pcov is not None:
-        s_sq = (errfunc(pfit, x, y)**2).sum()/(len(y)-len(pinit))
-        pcov = pcov * s_sq
-    else:
-        pcov = 0
-
-    error = []
-    for i in range(len(pfit)):
-        try:
-          error.append(np.absolute(pcov[i][i])**0.5)
-        except:
-          error.append( 0.00 )
-    pfit_leastsq = pfit
-    perr_leastsq = np.array(error)
-    return pfit_leastsq, perr_leastsq
-
-def single_peak_fit(array,lower,upper,count_offset=1,make_plot=False):
-    """
-    Performs single gaussian + exponential background fit
-
-    Args:
-        array: full array of counts (spectra)
-        lower,upper: bounds on spectra for window to fit inside
-        count_offset: correction for shift from left edge of spectrum
-        make_plot: flag for plotting fit result (diagnostic)
-
-    Returns:
-        list of fit parameters+errors
-    """
-    points = ar(range(lower,upper))
-    counts = ar(list(array[lower:upper]))
-
-    nentries = len(points)
-    mean = (upper + lower)/2.0
-    slope = (np.log(counts[-1])-np.log(counts[0]))/(points[-1]-points[0])
-    pinit = [counts[0],mean,5.0,counts[0]*count_offset,slope]
-    if verbose:
-        print(pinit)
-    pars,errs = peak_fitter(points,counts,gaus_plus_exp,pinit)
-    if make_plot:
-        fig = plt.figure()
-        fig.patch.set_facecolor('white')
-        plt.title('Spectra integrated over a day')
-        plt.xlabel('channels')
-        plt.ylabel('counts')
-        plt.xlim(1,500)
-        #plt.ylim()
-        x = ar(range(0,len(array)))
-        plt.plot(x,array,'b:',label='data')
-        plt.plot(x,gaus_plus_exp(x,pars),'ro:',label='fit')
-        plt.legend()
-        plt.yscale('log')
-        plt.show()
-
-    if verbose:
-        par_labels = ['norm','mean','sigma','amp','slope']
-        for i in range(len(pars)):
-            print('{}: {} +/- {}'.format(par_labels[i],pars[i],errs[i]))
-
-    return [pars[1],errs[1]],[pars[2],errs[2]],[pars[0],errs[0]]
-
-def double_peak_fit(array,lower,upper,pindex=0,count_offset=1,make_plot=False):
-    """
-    Performs double gaussian + exponential background fit
-
-    Args:
-        array: full array of counts (spectra)
-        lower,upper: bounds on spectra for window to fit inside
-        pindex: indication of which gaussian to get fit results for
-        count_offset: correction for shift from left edge of spectrum
-        make_plot: flag for plotting fit result (diagnostic)
-
-    Returns:
-        list of fit parameters+errors
-    """
-    points = ar(range(lower,upper))
-    counts = ar(list(array[lower:upper]))
-
-    nentries = len(points)
-    mean = (upper + lower)/2.0
-    slope = (np.log(counts[-1])-np.log(counts[0]))/(points[-1]-points[0])
-    pinit = [counts[0]/7.0,mean-5,3.0,counts[0]/7.0,mean+5,3.0, \
-             counts[0]*count_offset,slope]
-    if verbose:
-        print(pinit)
-    pars,errs = peak_fitter(points,counts,double_gaus_plus_exp,pinit)
-    if verbose:
-        par_labels = ['norm1','mean1','sigma1','norm2','mean2','sigma2','amp','slope']
-        for i in range(len(pars)):
-            print('{}: {} +/- {}'.format(par_labels[i],pars[i],errs[i]))
-
-    if make_plot:
-        fig = plt.figure()
-        fig.patch.set_facecolor('white')
-        plt.title('Spectra integrated over a day')
-        plt.xlabel('channels')
-        plt.ylabel('counts')
-        plt.xlim(1,500)
-        x = ar(range(0,len(array)))
-        plt.plot(x,array,'b:',label='data')
-        plt.plot(x,double_gaus_plus_exp(x,pars),'ro:',label='fit')
-        plt.legend()
-        plt.yscale('log')
-        plt.show()
-
-    mean = [pars[1],errs[1]]
-    sigma = [pars[2],errs[2]]
-    amp = [pars[0],errs[0]]
-    if (pindex==1 and pars[4] > pars[1]) or (pindex==0 and pars[4] < pars[1]):
-        mean = [pars[4],errs[4]]
-        sigma = [pars[5],errs[5]]
-        amp = [pars[3],errs[3]]
-        if errs[1] > errs[4]:
-            mean[1] = errs[1]
-        if abs(pars[2]-pars[5])/pars[2] > 0.8:
-            mean[1] = 150
-    return mean,sigma,amp
-
-def get_peak_counts(means,sigmas,amps):
-    '''
-    Calculate the area under a gaussian curve (estimate of counts in that peak)
-
-    Arguments:
-      - list of guassian means
-      - list of guassian widths
-      - list of gaussian amplitudes
-
-    Returns:
-      - list of counts from resulting gaussian integrations
-    '''
-    counts = []
-    for i in range(len(means)):
-        count,err = quad(gaus,0,500,args=(amps[i],means[i],sigmas[i]))
-        counts.append(count)
-    return counts
-
-def verify_data(means,sigmas,amps):
-	# check for bad fits and use average of surrounding good fits
-	for i in range(len(means)):
-		if means[i][1] > 100:
-			print('Fit {} is bad!'.format(i))
-			j = 1
-			k = 1
-			if i<(len(means)-j):
-				while means[i+j][1] > 100:
-					j += 1
-					print('Trying {}+{} out of {}'.format(i,j,len(means)))
-					if i >= (len(means)-j):
-						print('Abort!')
-						break
-			if i>k:
-				while means[i-k][1] > 100:
-					k += 1
-					if i<k:
-						break
-			if i>k and i<(len(means)-j):
-				print('Averaging over {} and {}'.format(i-k,i+j))
-				means[i][0] = (means[i+j][0]+means[i-k][0])/2.0
-				means[i][1] = (means[i+j][1]+means[i-k][1])/2.0
-				sigmas[i][0] = (sigmas[i+j][0]+sigmas[i-k][0])/2.0
-				sigmas[i][1] = (sigmas[i+j][1]+sigmas[i-k][1])/2.0
-				amps[i][0] = (amps[i+j][0]+amps[i-k][0])/2.0
-				amps[i][1] = (amps[i+j][1]+amps[i-k][1])/2.0
-			elif i<k and i<(len(means)-j):
-				print('Using {}'.format(i+j))
-				means[i][0] = means[i+j][0]
-				means[i][1] = means[i+j][1]
-				sigmas[i][0] = sigmas[i+j][0]
-				sigmas[i][1] = sigmas[i+j][1]
-				amps[i][0] = amps[i+j][0]
-				amps[i][1] = amps[i+j][1]
-			elif i>k and i>=(len(means)-j):
-				print('Using {}'.format(i-k))
-				means[i][0] = means[i-k][0]
-				means[i][1] = means[i-k][1]
-				sigmas[i][0] = sigmas[i-k][0]
-				sigmas[i][1] = sigmas[i-k][1]
-				amps[i][0] = amps[i-k][0]
-				amps[i][1] = amps[i-k][1]
-			else:
-				print('Nothing makes sense')
-	return means,sigmas,amps
-
-def get_peaks(rows, nhours, tstart, tstop, fit_function, fit_args):
-    '''
-    Applies double gaussian + expo fits to all data over some range of time
-
-    Arguments:
-      - full list of csv data input rows
-      - number of hours to integrate each calculation over
-      - start/stop times to run over
-      - peak fitting method
-      - arguments to be fed to the peak fitting method
-
-    Returns:
-      - lists of means,sigmas,amps from all gaussian fits
-        - each entry in list includes the value and uncertainty
-    '''
-    # print(rows)
-
-    datatz = rows[-1][1].tzinfo
-    date_itr = tstart
-    times = []
-    means = []
-    sigmas = []
-    amps = []
-    # break data up into days to speed up range selection
-    while date_itr < tstop:
-        next_day = date_itr+timedelta(days=1)
-        daily_row = [row for row in rows if \
-                    inTimeRange(row[1],date_itr,next_day)]
-        time_itr = date_itr
-        date_itr = next_day
-        while time_itr < date_itr:
-            time_next = time_itr+timedelta(hours=nhours)
-            integration = [row for row in rows if \
-                            inTimeRange(row[1],time_itr,time_next)]
-            time_itr = time_next
-
-            if len(integration)==0:
-                continue
-
-            array_lst = []
-            for j in integration:
-                array_lst.append(make_array(j))
-            integrated = sum(array_lst)
-            mean,sigma,amp = fit_function(integrated,*fit_args)
-            means.append(mean)
-            sigmas.append(sigma)
-            amps.append(amp)
-            times.append(integration[int(len(integration)/2)][1])
-
-    means,sigmas,amps = verify_data(means,sigmas,amps)
-    return times,means,sigmas,amps
+import os
+import numpy as np
+from scipy import optimize
+# scipy no longer re-exports the numpy functions
+from numpy import asarray as ar,exp
+from scipy.integrate import quad
+
+import matplotlib.pyplot as plt
+
+from dateutil.parser import parse
+from datetime import datetime
+from datetime import timedelta
+
+import batch_fitting
+import parallel_fits
+import spectra_windows
+import time_index
+
+verbose = 0
+# narrowest gaussian the bounded fitter allows (channels)
+min_sigma = 0.1
+# where fit plots are saved when a plot_name is given
+plot_dir = '/Users/alihanks/Google Drive/NQUAKE_analysis/D3S/fit_plots/'
+
+
+
+def inTimeRange(time_string,tstart,tstop):
+    time = tstart - timedelta(minutes=1)
+    if isinstance(time_string, str):
+        try:
+            time = parse(time_string)
+        except:
+            print('{} Not a time!'.format(time_string))
+            return False
+    elif isinstance(time_string, datetime):
+        time = time_string
+
+    # check that tzinfo is set for tz aware comparisons
+    if tstart.tzinfo==None:
+        tstart = tstart.replace(tzinfo=time.tzinfo)
+    if tstop.tzinfo==None:
+        tstop = tstop.replace(tzinfo=time.tzinfo)
+    return (time > tstart and time < tstop)
+
+# -------------------------------------------------------------------------- #
+# Fit Functions
+# -------------------------------------------------------------------------- #
+
+def lbound(bound,par):
+    return 1e4*np.sqrt(bound-par) + 1e-3*(bound-par) if (par<bound) else 0
+
+def ubound(bound,par):
+    return 1e4*np.sqrt(par-bound) + 1e-3*(par-bound) if (par>bound) else 0
+
+def bound(bounds,par):
+    return lbound(bounds[0],par) + ubound(bounds[1],par)
+
+def fixed(fix,par):
+    return bound((fix,fix), par)
+
+def gaus(x,a,x0,sigma):
+    return a*exp(-(x-x0)**2/(2*sigma**2))+lbound(0,a)+lbound(0,sigma)+lbound(0,x0)
+
+def expo(x,a,slope):
+    return a*exp(x*slope)
+
+# p = [a1,mean,sigma,a2,shift,slope,const]
+def gaus_plus_exp(x,p):
+    return gaus(x,p[0],p[1],p[2])+expo(x,p[3],p[4])
+
+# p = [a1,mean,sigma,slope,const]
+def gaus_plus_line(x,p):
+    return gaus(x,p[0],p[1],p[2])+p[3]*x+p[4]
+
+def double_gaus_plus_exp(x,p):
+    return gaus(x,p[0],p[1],p[2])+gaus(x,p[3],p[4],p[5])+expo(x,p[6],p[7])
+
+def double_gaus_plus_line(x,p):
+    return gaus(x,p[0],p[1],p[2])+gaus(x,p[3],p[4],p[5])+p[6]*x+p[7]
+
+# -------------------------------------------------------------------------- #
+# Fit Function Jacobians
+#   - derivatives of a fit function with respect to each parameter, one
+#     column per parameter, given to leastsq as Dfun so it does not have
+#     to estimate them by finite differences (see peak_fitter)
+#   - the bound penalties are differentiated too
+# -------------------------------------------------------------------------- #
+def lbound_grad(bound,par):
+    return -5e3/np.sqrt(bound-par) - 1e-3 if (par<bound) else 0
+
+def ubound_grad(bound,par):
+    return 5e3/np.sqrt(par-bound) + 1e-3 if (par>bound) else 0
+
+def gaus_grad(x,a,x0,sigma):
+    g = exp(-(x-x0)**2/(2*sigma**2))
+    return [g+lbound_grad(0,a),
+            a*g*(x-x0)/sigma**2+lbound_grad(0,x0),
+            a*g*(x-x0)**2/sigma**3+lbound_grad(0,sigma)]
+
+def expo_grad(x,a,slope):
+    e = exp(x*slope)
+    return [e,a*x*e]
+
+def gaus_plus_exp_jacobian(x,p):
+    return np.column_stack(gaus_grad(x,p[0],p[1],p[2])+expo_grad(x,p[3],p[4]))
+gaus_plus_exp.jacobian = gaus_plus_exp_jacobian
+
+def gaus_plus_line_jacobian(x,p):
+    return np.column_stack(gaus_grad(x,p[0],p[1],p[2])+[x,np.ones(len(x))])
+gaus_plus_line.jacobian = gaus_plus_line_jacobian
+
+def double_gaus_plus_exp_jacobian(x,p):
+    return np.column_stack(gaus_grad(x,p[0],p[1],p[2])+gaus_grad(x,p[3],p[4],p[5])
+                           +expo_grad(x,p[6],p[7]))
+# not given to double_gaus_plus_exp: with it about one fit in ten of two
+# close peaks runs to leastsq's maxfev and the fits are slower than with
+# finite differences (see benchmarks.benchmark_fit_jacobian)
+
+def double_gaus_plus_line_jacobian(x,p):
+    return np.column_stack(gaus_grad(x,p[0],p[1],p[2])+gaus_grad(x,p[3],p[4],p[5])
+                           +[x,np.ones(len(x))])
+double_gaus_plus_line.jacobian = double_gaus_plus_line_jacobian
+
+# -------------------------------------------------------------------------- #
+# Pure models for the bounded fitter
+#   - no penalty terms: the parameter limits are box constraints of the
+#     fit instead (see bounded_peak_fitter and peak_bounds)
+#   - they broadcast over stacked parameters, so batch_fitting can fit
+#     many windows at once (see batch_peak_fit)
+# -------------------------------------------------------------------------- #
+def gaussian(x,a,x0,sigma):
+    return a*np.exp(-(x-x0)**2/(2*sigma**2))
+
+def gaussian_grad(x,a,x0,sigma):
+    g = np.exp(-(x-x0)**2/(2*sigma**2))
+    return [g,a*g*(x-x0)/sigma**2,a*g*(x-x0)**2/sigma**3]
+
+def exponential_grad(x,a,slope):
+    e = np.exp(x*slope)
+    return [e,a*x*e]
+
+# p = [a1,mean,sigma,amp,slope]
+def pure_gaus_plus_exp(x,p):
+    return gaussian(x,p[0],p[1],p[2])+p[3]*np.exp(x*p[4])
+
+def pure_gaus_plus_exp_jacobian(x,p):
+    return np.stack(gaussian_grad(x,p[0],p[1],p[2])+exponential_grad(x,p[3],p[4]),axis=-1)
+pure_gaus_plus_exp.jacobian = pure_gaus_plus_exp_jacobian
+
+# p = [a1,mean1,sigma1,a2,mean2,sigma2,amp,slope]
+def pure_double_gaus_plus_exp(x,p):
+    return gaussian(x,p[0],p[1],p[2])+gaussian(x,p[3],p[4],p[5])+p[6]*np.exp(x*p[7])
+
+def pure_double_gaus_plus_exp_jacobian(x,p):
+    return np.stack(gaussian_grad(x,p[0],p[1],p[2])+gaussian_grad(x,p[3],p[4],p[5])
+                    +exponential_grad(x,p[6],p[7]),axis=-1)
+pure_double_gaus_plus_exp.jacobian = pure_double_gaus_plus_exp_jacobian
+
+def peak_bounds(npeaks,points):
+    """
+    Box constraints matching the penalties of gaus, with the means kept
+    inside the fit window and the widths below the window size
+
+    Args:
+        npeaks: number of gaussians in the model
+        points: channels of the fit window
+
+    Returns:
+        lower and upper limits of [a,mean,sigma]*npeaks + [amp,slope]
+    """
+    width = points[-1] - points[0]
+    lower = [0,points[0],min_sigma]*npeaks + [-np.inf,-np.inf]
+    upper = [np.inf,points[-1],width/2.0]*npeaks + [np.inf,np.inf]
+    return lower, upper
+
+def peak_seeds(counts,lower,upper,npeaks=1,count_offset=1):
+    """
+    Initial parameters of the gaussian(s) + exponential fits, from the
+    counts at the edges of the fit window
+
+    Args:
+        counts: counts of channels lower..upper-1, one row per window for
+            several windows
+        lower,upper: bounds on spectra for window to fit inside
+        npeaks: number of gaussians in the model
+        count_offset: correction for shift from left edge of spectrum
+
+    Returns:
+        array of [a,mean,sigma]*npeaks + [amp,slope], one row per window
+        for several windows
+    """
+    counts = np.asarray(counts,dtype=float)
+    first, last = counts[...,0], counts[...,-1]
+    ones = np.ones_like(first)
+    mean = (upper + lower)/2.0
+    slope = (np.log(last)-np.log(first))/(upper-1-lower)
+    if npeaks == 1:
+        pinit = [first,mean*ones,5.0*ones,first*count_offset,slope]
+    else:
+        pinit = [first/7.0,(mean-5.0)*ones,3.0*ones,first/7.0,(mean+5.0)*ones,3.0*ones, \
+                 first*count_offset,slope]
+    return np.stack(pinit,axis=-1)
+
+def peak_fitter(x,y,fit_function,pinit,info=None):
+    """
+    Peak Finder for peak in specified range
+
+    Args:
+        x: data x values for fitting
+        y: data y values for fitting
+        fit_function: fit function
+        pinit: initial parameters for fit function
+        info: optional dict, filled with the number of function
+            evaluations 'nfev' and jacobian evaluations 'njev' (0 with
+            finite differences) and whether the fit converged 'success'
+
+    Returns:
+        array of resulting fit parameters and array of fit errors
+    """
+    errfunc = lambda p, x, y: fit_function(x,p) - y
+    # closed-form derivatives of the fit function if it has them
+    jacobian = getattr(fit_function,'jacobian',None)
+    Dfun = None if jacobian is None else lambda p, x, y: jacobian(x,p)
+    pfit,pcov,infodict,errmsg,success = \
+        optimize.leastsq(errfunc, pinit, args=(x,y), Dfun=Dfun, \
+            full_output=1, epsfcn=0.0001)
+    if info is not None:
+        info['nfev'] = infodict['nfev']
+        info['njev'] = infodict.get('njev',0)
+        info['success'] = success in (1,2,3,4)
+
+    if (len(y) > len(pinit)) and pcov is not None:
+        s_sq = (errfunc(pfit, x, y)**2).sum()/(len(y)-len(pinit))
+        pcov = pcov * s_sq
+    else:
+        pcov = 0
+
+    error = []
+    for i in range(len(pfit)):
+        try:
+          error.append(np.absolute(pcov[i][i])**0.5)
+        except:
+          error.append( 0.00 )
+    pfit_leastsq = pfit
+    perr_leastsq = np.array(error)
+    return pfit_leastsq, perr_leastsq
+
+def bounded_peak_fitter(x,y,fit_function,pinit,bounds,info=None):
+    """
+    Peak Finder for peak in specified range, with box constraints
+
+    Trust-region reflective least squares on a pure model: the parameters
+    stay within bounds instead of being pushed back by penalty terms, so
+    the residuals are smooth and the result only depends on the inputs.
+
+    Args:
+        x: data x values for fitting
+        y: data y values for fitting
+        fit_function: pure fit function, with a jacobian if it has one
+        pinit: initial parameters for fit function, moved inside bounds
+        bounds: lower and upper parameter limits (see peak_bounds)
+        info: optional dict, filled as by peak_fitter
+
+    Returns:
+        array of resulting fit parameters and array of fit errors
+    """
+    x = np.asarray(x,dtype=float)
+    y = np.asarray(y,dtype=float)
+    lower, upper = np.asarray(bounds[0],float), np.asarray(bounds[1],float)
+    pinit = np.clip(np.nan_to_num(np.asarray(pinit,dtype=float)),lower,upper)
+    jacobian = getattr(fit_function,'jacobian',None)
+    jac = '2-point' if jacobian is None else lambda p: jacobian(x,p)
+    result = optimize.least_squares(lambda p: fit_function(x,p) - y, pinit, \
+        jac=jac, bounds=(lower,upper), method='trf')
+    pfit = result.x
+    if info is not None:
+        info['nfev'] = result.nfev
+        info['njev'] = result.njev or 0
+        info['success'] = result.success
+
+    # covariance from the jacobian at the solution, scaled by the
+    # (fit - data) variance as in peak_fitter
+    error = np.zeros(len(pfit))
+    if len(y) > len(pfit):
+        s_sq = (result.fun**2).sum()/(len(y)-len(pfit))
+        pcov = np.linalg.pinv(np.dot(result.jac.T,result.jac))*s_sq
+        error = np.absolute(np.diag(pcov))**0.5
+    return pfit, error
+
+def fit_converged(points,pars,errs,info,npeaks=1):
+    """
+    Convergence check of a peak fit: the fitter converged, the means lie
+    in the fit window with a positive width, their errors are below the
+    bad fit threshold (100) of the time series checks and two gaussians
+    have similar widths (see select_peak)
+
+    Args:
+        points: channels of the fit window
+        pars,errs: fit parameters and errors
+        info: fit info (see peak_fitter)
+        npeaks: number of gaussians in the model
+
+    Returns:
+        True for a good fit
+    """
+    means, sigmas = pars[1:3*npeaks:3], pars[2:3*npeaks:3]
+    mean_errs = errs[1:3*npeaks:3]
+    return bool(info['success'] and np.all(np.isfinite(pars)) and
+                np.all((means >= points[0]) & (means <= points[-1])) and
+                np.all(sigmas > 0) and np.all(mean_errs <= 100) and
+                abs(sigmas[0]-sigmas[-1])/sigmas[0] <= 0.8)
+
+def fit_window(points,counts,npeaks,pinit,warm_start=None,backend='leastsq'):
+    """
+    Fits gaussian(s) + exponential to the counts of one fit window
+
+    With warm_start, the fit is seeded with the parameters of the last
+    good fit (see fit_converged) of the previous windows, and falls back
+    to pinit when that fit does not pass the check.
+
+    Args:
+        points,counts: channels and counts of the fit window
+        npeaks: number of gaussians in the model
+        pinit: initial parameters (see peak_seeds)
+        warm_start: optional dict carried from one window to the next:
+            the seed 'pars', and counts of 'fits', function evaluations
+            'nfev', 'fallbacks' to pinit and 'failures' (bad fits)
+        backend: 'leastsq' for unconstrained fits with the penalty terms
+            of gaus and expo (see peak_fitter), 'bounded' for box
+            constrained fits of the pure models (see bounded_peak_fitter),
+            slower but the parameters never leave their limits
+
+    Returns:
+        array of resulting fit parameters and array of fit errors
+    """
+    if backend not in ('leastsq','bounded'):
+        raise ValueError('unknown fit backend {!r}'.format(backend))
+    seeds = [pinit]
+    if warm_start is not None and warm_start.get('pars') is not None:
+        seeds = [warm_start['pars'],pinit]
+    for seed in seeds:
+        info = {}
+        if backend == 'bounded' and npeaks == 1:
+            pars,errs = bounded_peak_fitter(points,counts,pure_gaus_plus_exp,seed,
+                                            peak_bounds(1,points),info)
+        elif backend == 'bounded':
+            pars,errs = bounded_peak_fitter(points,counts,pure_double_gaus_plus_exp,
+                                            seed,peak_bounds(2,points),info)
+        elif npeaks == 1:
+            pars,errs = peak_fitter(points,counts,gaus_plus_exp,seed,info)
+        else:
+            pars,errs = peak_fitter(points,counts,double_gaus_plus_exp,seed,info)
+        if warm_start is None:
+            return pars,errs
+        warm_start['nfev'] = warm_start.get('nfev',0) + info['nfev']
+        good = fit_converged(points,pars,errs,info,npeaks)
+        if good:
+            break
+
+    warm_start['fits'] = warm_start.get('fits',0) + 1
+    if len(seeds) > 1 and seed is pinit:
+        warm_start['fallbacks'] = warm_start.get('fallbacks',0) + 1
+    if good:
+        warm_start['pars'] = pars
+    else:
+        warm_start['failures'] = warm_start.get('failures',0) + 1
+    return pars,errs
+
+def warm_start_summary(warm_start):
+    """
+    One line report of the fits of a warm started time series
+    """
+    fits = max(warm_start.get('fits',0),1)
+    return 'Warm start: {} fits, {:.1f} function evaluations per fit, ' \
+        '{} fell back to the default seed, {} failed ({:.1%})'.format(
+            warm_start.get('fits',0),warm_start.get('nfev',0)/float(fits),
+            warm_start.get('fallbacks',0),warm_start.get('failures',0),
+            warm_start.get('failures',0)/float(fits))
+
+def select_peak(pars,errs,pindex=0):
+    """
+    Picks one gaussian out of a double gaussian + exponential fit
+
+    Args:
+        pars,errs: fit parameters and errors
+        pindex: 0 for the gaussian at the lower channel, 1 for the upper
+
+    Returns:
+        mean,sigma,amp as lists of fit value+error; the mean error is set
+        to 150 (a bad fit) when the two widths disagree
+    """
+    mean = [pars[1],errs[1]]
+    sigma = [pars[2],errs[2]]
+    amp = [pars[0],errs[0]]
+    if (pindex==1 and pars[4] > pars[1]) or (pindex==0 and pars[4] < pars[1]):
+        mean = [pars[4],errs[4]]
+        sigma = [pars[5],errs[5]]
+        amp = [pars[3],errs[3]]
+        if errs[1] > errs[4]:
+            mean[1] = errs[1]
+        if abs(pars[2]-pars[5])/pars[2] > 0.8:
+            mean[1] = 150
+    return mean,sigma,amp
+
+def save_plot(plot_name,counter):
+    """
+    Saves the current fit plot in plot_dir as <plot_name>_fit_<counter>.pdf,
+    or shows it without a plot_name
+    """
+    if not plot_name:
+        plt.show()
+        return
+    plt.savefig(os.path.join(plot_dir,'{}_fit_{}.pdf'.format(plot_name,counter)))
+    plt.close()
+
+def single_peak_fit(array,lower,upper,count_offset=1,make_plot=False,plot_name='',
+                    counter=0,warm_start=None,backend='leastsq'):
+    """
+    Performs single gaussian + exponential background fit
+
+    Args:
+        array: full array of counts (spectra)
+        lower,upper: bounds on spectra for window to fit inside
+        count_offset: correction for shift from left edge of spectrum
+        make_plot: flag for plotting fit result (diagnostic)
+        plot_name: save the plot in plot_dir as <plot_name>_fit_<counter>.pdf
+            instead of showing it
+        counter: index of the window in a time series (see get_peaks)
+        warm_start: optional state carried between windows (see fit_window)
+        backend: 'leastsq' or 'bounded' fits (see fit_window)
+
+    Returns:
+        list of fit parameters+errors
+    """
+    points = ar(range(lower,upper))
+    counts = ar(list(array[lower:upper]))
+
+    nentries = len(points)
+    pinit = peak_seeds(counts,lower,upper,1,count_offset)
+    if verbose:
+        print(pinit)
+    pars,errs = fit_window(points,counts,1,pinit,warm_start,backend)
+    if make_plot:
+        fig = plt.figure()
+        fig.patch.set_facecolor('white')
+        plt.title('Spectra integrated over a day')
+        plt.xlabel('channels')
+        plt.ylabel('counts')
+        plt.xlim(lower,upper)
+        #plt.ylim()
+        x = ar(range(0,len(array)))
+        plt.plot(x,array,'b:',label='data')
+        plt.plot(x,gaus_plus_exp(x,pars),'ro:',label='fit')
+        plt.legend()
+        plt.yscale('log')
+        save_plot(plot_name,counter)
+
+    if verbose:
+        par_labels = ['norm','mean','sigma','amp','slope']
+        for i in range(len(pars)):
+            print('{}-{}: {} +/- {}'.format(par_labels[i],counter,pars[i],errs[i]))
+
+    return [pars[1],errs[1]],[pars[2],errs[2]],[pars[0],errs[0]]
+
+def double_peak_fit(array,lower,upper,pindex=0,count_offset=1,make_plot=False,plot_name='',
+                    counter=0,warm_start=None,backend='leastsq'):
+    """
+    Performs double gaussian + exponential background fit
+
+    Args:
+        array: full array of counts (spectra)
+        lower,upper: bounds on spectra for window to fit inside
+        pindex: indication of which gaussian to get fit results for
+        count_offset: correction for shift from left edge of spectrum
+        make_plot: flag for plotting fit result (diagnostic)
+        plot_name: save the plot in plot_dir as <plot_name>_fit_<counter>.pdf
+            instead of showing it
+        counter: index of the window in a time series (see get_peaks)
+        warm_start: optional state carried between windows (see fit_window)
+        backend: 'leastsq' or 'bounded' fits (see fit_window)
+
+    Returns:
+        list of fit parameters+errors
+    """
+    points = ar(range(lower,upper))
+    counts = ar(list(array[lower:upper]))
+
+    nentries = len(points)
+    pinit = peak_seeds(counts,lower,upper,2,count_offset)
+    if verbose:
+        print(pinit)
+    pars,errs = fit_window(points,counts,2,pinit,warm_start,backend)
+    if verbose:
+        par_labels = ['norm1','mean1','sigma1','norm2','mean2','sigma2','amp','slope']
+        for i in range(len(pars)):
+            print('{}-{}: {} +/- {}'.format(par_labels[i],counter,pars[i],errs[i]))
+
+    if make_plot:
+        fig = plt.figure()
+        fig.patch.set_facecolor('white')
+        plt.title('Spectra integrated over a day')
+        plt.xlabel('channels')
+        plt.ylabel('counts')
+        plt.xlim(lower,upper)
+        plt.ylim(20,1000)
+        x = ar(range(0,len(array)))
+        plt.plot(x,array,'b:',label='data')
+        plt.plot(x,double_gaus_plus_exp(x,pars),'ro:',label='fit')
+        plt.legend()
+        plt.yscale('log')
+        save_plot(plot_name,counter)
+
+    return select_peak(pars,errs,pindex)
+
+def batch_peak_fit(arrays,lower,upper,npeaks=1,count_offset=1):
+    """
+    Fits many spectra at once with the pure gaussian(s) + exponential model
+    within peak_bounds (see batch_fitting.batch_leastsq); spectra the batch
+    does not converge on are refit one at a time with bounded_peak_fitter
+
+    Args:
+        arrays: full arrays of counts (spectra), one per window
+        lower,upper: bounds on spectra for window to fit inside
+        npeaks: number of gaussians in the model
+        count_offset: correction for shift from left edge of spectrum
+
+    Returns:
+        arrays of fit parameters and of fit errors, one row per spectrum
+    """
+    points = ar(range(lower,upper))
+    counts = np.array([np.asarray(array,dtype=float)[lower:upper] for array in arrays])
+    counts = counts.reshape(-1,len(points))
+    fit_function = pure_gaus_plus_exp if npeaks == 1 else pure_double_gaus_plus_exp
+    pinit = peak_seeds(counts,lower,upper,npeaks,count_offset)
+    bounds = peak_bounds(npeaks,points)
+    pars,errs,niter,converged = batch_fitting.batch_leastsq(fit_function,points,
+                                                            counts,pinit,bounds)
+    for i in np.flatnonzero(~converged):
+        pars[i],errs[i] = bounded_peak_fitter(points,counts[i],fit_function,
+                                              pinit[i],bounds)
+    if verbose:
+        print('{} of {} fits converged in the batch, {} iterations at most'.format(
+            converged.sum(),len(converged),niter.max() if len(niter) else 0))
+    return pars,errs
+
+def batch_single_peak_fit(arrays,lower,upper,count_offset=1,make_plot=False,plot_name=''):
+    """
+    single_peak_fit of many spectra at once (see batch_peak_fit)
+
+    Takes the arguments of single_peak_fit with a list of spectra in place
+    of array, but no counter or warm_start; make_plot and plot_name are
+    ignored (no plots are made)
+
+    Returns:
+        lists of means,sigmas,amps (fit value+error), one per spectrum
+    """
+    pars,errs = batch_peak_fit(arrays,lower,upper,1,count_offset)
+    means = [[p[1],e[1]] for p,e in zip(pars,errs)]
+    sigmas = [[p[2],e[2]] for p,e in zip(pars,errs)]
+    amps = [[p[0],e[0]] for p,e in zip(pars,errs)]
+    return means,sigmas,amps
+
+def batch_double_peak_fit(arrays,lower,upper,pindex=0,count_offset=1,make_plot=False,plot_name=''):
+    """
+    double_peak_fit of many spectra at once (see batch_peak_fit)
+
+    Takes the arguments of double_peak_fit with a list of spectra in place
+    of array, but no counter or warm_start; make_plot and plot_name are
+    ignored (no plots are made)
+
+    Returns:
+        lists of means,sigmas,amps (fit value+error), one per spectrum
+    """
+    pars,errs = batch_peak_fit(arrays,lower,upper,2,count_offset)
+    results = [select_peak(p,e,pindex) for p,e in zip(pars,errs)]
+    return [r[0] for r in results],[r[1] for r in results],[r[2] for r in results]
+
+# batched versions, used by get_peaks(batch=True)
+single_peak_fit.batch = batch_single_peak_fit
+double_peak_fit.batch = batch_double_peak_fit
+
+def get_peak_counts(means,sigmas,amps):
+    '''
+    Calculate the area under a gaussian curve (estimate of counts in that peak)
+
+    Arguments:
+      - list of guassian means
+      - list of guassian widths
+      - list of gaussian amplitudes
+
+    Returns:
+      - list of counts from resulting gaussian integrations
+    '''
+    counts = []
+    for i in range(len(means)):
+        count,err = quad(gaussian,0,500,args=(amps[i],means[i],sigmas[i]))
+        counts.append(count)
+    return counts
+
+def verify_data(means,sigmas,amps):
+    # check for bad fits and use average of surrounding good fits
+    for i in range(len(means)):
+        if means[i][1] > 100:
+            print('Fit {} is bad!'.format(i))
+            j = 1
+            k = 1
+            if i<(len(means)-j):
+                while means[i+j][1] > 100:
+                    j += 1
+                    print('Trying {}+{} out of {}'.format(i,j,len(means)))
+                    if i >= (len(means)-j):
+                        print('Abort!')
+                        break
+            if i>k:
+                while means[i-k][1] > 100:
+                    k += 1
+                    if i<k:
+                        break
+            if i>k and i<(len(means)-j):
+                print('Averaging over {} and {}'.format(i-k,i+j))
+                means[i][0] = (means[i+j][0]+means[i-k][0])/2.0
+                means[i][1] = (means[i+j][1]+means[i-k][1])/2.0
+                sigmas[i][0] = (sigmas[i+j][0]+sigmas[i-k][0])/2.0
+                sigmas[i][1] = (sigmas[i+j][1]+sigmas[i-k][1])/2.0
+                amps[i][0] = (amps[i+j][0]+amps[i-k][0])/2.0
+                amps[i][1] = (amps[i+j][1]+amps[i-k][1])/2.0
+            elif i<k and i<(len(means)-j):
+                print('Using {}'.format(i+j))
+                means[i][0] = means[i+j][0]
+                means[i][1] = means[i+j][1]
+                sigmas[i][0] = sigmas[i+j][0]
+                sigmas[i][1] = sigmas[i+j][1]
+                amps[i][0] = amps[i+j][0]
+                amps[i][1] = amps[i+j][1]
+            elif i>k and i>=(len(means)-j):
+                print('Using {}'.format(i-k))
+                means[i][0] = means[i-k][0]
+                means[i][1] = means[i-k][1]
+                sigmas[i][0] = sigmas[i-k][0]
+                sigmas[i][1] = sigmas[i-k][1]
+                amps[i][0] = amps[i-k][0]
+                amps[i][1] = amps[i-k][1]
+            else:
+                print('Nothing makes sense')
+    return means,sigmas,amps
+
+def get_peaks(times, spectra, nhours, tstart, tstop, fit_function, fit_args,
+              prefix=None, min_coverage=0, normalize=False, windows=None,
+              batch=False, warm_start=False, workers=1, backend=None):
+    '''
+    Applies double gaussian + expo fits to all data over some range of time
+
+    Arguments:
+      - sorted UTC epoch times and matrix of spectra
+        (see spectra_io.read_spectra)
+      - number of hours to integrate each calculation over
+      - start/stop times to run over
+      - peak fitting method, called with the window counts, the
+        arguments below and the window index as counter
+      - arguments to be fed to the peak fitting method
+      - prefix: optional prefix sums of the spectra, to get each window
+        from two rows of it (see spectra_windows.open_index)
+      - min_coverage: skip windows with a smaller fraction of their length
+        covered by data instead of fitting them
+      - normalize: scale each window's counts to its full length
+      - windows: optional iterable of (start, mid, nrows, counts), e.g.
+        spectra_windows.stream_windows over a file too large to load,
+        fitted one at a time instead of integrating times and spectra
+        (the stream applies min_coverage and normalize itself)
+      - batch: fit all windows at once with fit_function.batch
+        (see batch_peak_fit) instead of one fit_function call per window
+      - warm_start: seed each fit with the previous good fit (see
+        fit_window) and print the number of function evaluations and
+        failed fits; True, or a dict to also get these counts back
+      - workers: fit the windows in this many processes, sharing the
+        integrated spectra through shared memory (see parallel_fits);
+        the results are the same as with one
+      - backend: fit backend passed to the fit method for every window,
+        'leastsq' (the default of single_peak_fit and double_peak_fit) or
+        'bounded' (see fit_window); None leaves the fit method's default.
+        Batch fits always fit the bounded pure models (see batch_peak_fit)
+
+    Returns:
+      - lists of means,sigmas,amps from all gaussian fits
+        - each entry in list includes the value and uncertainty
+    '''
+    means = []
+    sigmas = []
+    amps = []
+    if windows is None:
+        # integrate every nhours window (a day at a time) in one pass
+        window_times, integrated = spectra_windows.window_spectra( \
+            times,spectra,nhours,tstart,tstop,prefix,min_coverage,normalize)
+        windows = zip(window_times, integrated)
+    else:
+        windows = ((mid, counts) for start, mid, nrows, counts in windows)
+    window_times = []
+    if batch and warm_start is not False:
+        raise ValueError('warm_start chains serial fits, it cannot be batched')
+    if workers > 1 and (batch or warm_start is not False):
+        raise ValueError('batch and warm_start fits run in one process')
+    if batch and backend is not None:
+        raise ValueError('batch fits always fit the bounded pure models')
+    fit_kwargs = {}
+    if backend is not None:
+        fit_kwargs['backend'] = backend
+    if warm_start is not False:
+        fit_kwargs['warm_start'] = {} if warm_start is True else warm_start
+    if batch:
+        windows = list(windows)
+        window_times = [window_time for window_time, counts in windows]
+        means,sigmas,amps = fit_function.batch( \
+            [counts for window_time, counts in windows],*fit_args)
+    elif workers > 1:
+        windows = list(windows)
+        window_times = [window_time for window_time, counts in windows]
+        fits = parallel_fits.map_windows(fit_function, \
+            [counts for window_time, counts in windows],fit_args,workers, \
+            with_counter=True,fit_kwargs=fit_kwargs)
+        for mean,sigma,amp in fits:
+            means.append(mean)
+            sigmas.append(sigma)
+            amps.append(amp)
+    else:
+        for counter, (window_time, counts) in enumerate(windows):
+            window_times.append(window_time)
+            mean,sigma,amp = fit_function(counts,*fit_args,counter=counter,
+                                          **fit_kwargs)
+            means.append(mean)
+            sigmas.append(sigma)
+            amps.append(amp)
+    if warm_start is not False:
+        print(warm_start_summary(fit_kwargs['warm_start']))
+
+    means,sigmas,amps = verify_data(means,sigmas,amps)
+    return window_times,means,sigmas,amps
+
+def get_rolling_peaks(times, spectra, nhours, step_minutes, tstart, tstop,
+                      fit_function, fit_args, min_coverage=0):
+    '''
+    Applies peak fits to overlapping windows of data, e.g. 4 hour windows
+    stepped every 30 minutes (see spectra_windows.rolling_spectra)
+
+    Arguments:
+      - sorted UTC epoch times and matrix of spectra
+        (see spectra_io.read_spectra)
+      - number of hours to integrate each calculation over
+      - minutes between the starts of consecutive windows
+      - start/stop times to run over
+      - peak fitting method, called as in get_peaks
+      - arguments to be fed to the peak fitting method
+      - min_coverage: skip windows with a smaller fraction of their length
+        covered by data instead of fitting them
+
+    Returns:
+      - lists of window times, means, sigmas, amps from all gaussian fits
+        - each entry in list includes the value and uncertainty
+      - list of live times (s) of the windows, short where data is missing
+    '''
+    window_times = []
+    means = []
+    sigmas = []
+    amps = []
+    live_times = []
+    rolling = spectra_windows.rolling_spectra(times,spectra,nhours,step_minutes,
+                                              tstart,tstop,min_coverage=min_coverage)
+    for counter, (window_time, counts, live_time) in enumerate(rolling):
+        mean,sigma,amp = fit_function(counts,*fit_args,counter=counter)
+        window_times.append(window_time)
+        means.append(mean)
+        sigmas.append(sigma)
+        amps.append(amp)
+        live_times.append(live_time)
+
+    means,sigmas,amps = verify_data(means,sigmas,amps)
+    return window_times,means,sigmas,amps,live_times
@@ -0,0 +1,612 @@
+'''
+Columnar ingestion of D3S spectra.
+
+A D3S csv row carries a handful of metadata columns followed by one count
+per channel. Rather than keeping the whole file as lists of strings and
+converting a row at a time with make_int, the file is streamed once into
+  - an int64 vector of UTC epoch seconds (one entry per row)
+  - a 2-D uint32 matrix of counts (rows x channels)
+
+The same arrays can be saved to a binary archive that is memory-mapped on
+open, so only the pages for the rows actually used are read from disk:
+  - 64 byte header: magic, row count, channel count, utc offset and the
+    byte offsets of the two blocks below
+  - int64 time index (one entry per row)
+  - uint32 counts block (rows x channels), page aligned
+
+Rows are in chronological order, so a time window can be pushed down into
+the reader: rows before the window are skipped on a string comparison of
+their timestamp, reading stops at the first row past the window (closing
+the connection for a url), and for a local file the start of the window is
+found by bisecting byte offsets instead of reading the rows before it.
+
+Csv files, urls and archives compressed with gzip, bz2 or xz are
+recognized by their first bytes and decompressed in a stream while they
+are read. A compressed archive cannot be memory-mapped and is read into
+memory instead.
+
+To convert a csv (or url) into an archive, compressed if the name ends in
+.gz, .bz2 or .xz:
+    python spectra_io.py lbl_outside_d3s.csv lbl_outside_d3s.d3s
+'''
+import bz2
+import codecs
+import gzip
+import io
+import json
+import lzma
+import os
+import struct
+import sys
+import numpy as np
+from datetime import timedelta
+from dateutil.parser import parse
+from dateutil.tz import tzoffset
+from urllib.error import HTTPError
+from urllib.request import Request
+from urllib.request import urlopen
+
+try:
+    from .time_index import utc, to_epoch, from_epoch, parse_times, sort_index
+    from .time_index import window_slice, LOCAL_WIDTH
+except ImportError:
+    # run from this directory rather than as the D3S_analysis package
+    from time_index import utc, to_epoch, from_epoch, parse_times, sort_index
+    from time_index import window_slice, LOCAL_WIDTH
+
+# Default layout of the D3S csv files on radwatch
+TIME_COL = 1
+FIRST_CHANNEL = 12
+NCHANNELS = 1024
+
+ARCHIVE_MAGIC = b'D3SARCH1'
+# magic, nrows, nchannels, utc offset (s), times offset, counts offset
+ARCHIVE_HEADER = struct.Struct('<8sQIiQQ')
+ARCHIVE_HEADER_SIZE = 64
+PAGE_SIZE = 4096
+
+# leading bytes of each compressed format and the module that reads it
+COMPRESSED_FORMATS = (
+    (b'\x1f\x8b', gzip),
+    (b'BZh', bz2),
+    (b'\xfd7zXZ\x00', lzma),
+)
+# file name extensions written compressed by write_archive
+COMPRESSED_EXTENSIONS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+
+# bytes re-downloaded from the end of a mirrored csv to check it still matches
+SYNC_OVERLAP = 1024
+
+# rows kept either side of a pushed down window: local wall-clock times are
+# only ordered up to daylight saving jumps, the exact cut is made on UTC
+PUSHDOWN_MARGIN = timedelta(days=1)
+
+#--------------------------------------------------------------------------#
+# Reading
+#--------------------------------------------------------------------------#
+def compression(stream):
+    '''
+    Module (gzip, bz2 or lzma) that decompresses a binary stream or local
+    file, None if it is not compressed
+    '''
+    if isinstance(stream, str):
+        with open(stream, 'rb') as f:
+            return compression(f)
+    if hasattr(stream, 'peek'):
+        magic = stream.peek(8)
+    else:
+        magic = stream.read(8)
+        stream.seek(-len(magic), os.SEEK_CUR)
+    for prefix, codec in COMPRESSED_FORMATS:
+        if magic.startswith(prefix):
+            return codec
+    return None
+
+def open_stream(stream):
+    '''
+    Wrap a binary stream so that compressed data is decompressed in
+    chunks as it is read
+    '''
+    if not hasattr(stream, 'peek') and not stream.seekable():
+        stream = io.BufferedReader(stream)
+    codec = compression(stream)
+    if codec is None:
+        return stream
+    return codec.open(stream, 'rb')
+
+def iter_lines(source, offset=0):
+    '''
+    Yield text lines from a local path, a url or an open file/iterable
+      - gzip, bz2 and xz data is decompressed on the fly
+      - offset: byte offset to start from in an uncompressed local file
+      - closing the generator closes the file or connection
+    '''
+    if isinstance(source, str):
+        if source.startswith(('http://', 'https://')):
+            response = urlopen(source)
+            try:
+                for line in codecs.iterdecode(open_stream(response), 'utf-8'):
+                    yield line
+            finally:
+                response.close()
+        else:
+            with open(source, 'rb') as f:
+                f.seek(offset)
+                for line in open_stream(f):
+                    yield line.decode('utf-8')
+        return
+    for line in source:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        yield line
+
+def iter_spectra(source, time_col=TIME_COL, first_channel=FIRST_CHANNEL,
+                 nchannels=NCHANNELS, chunk_rows=4096, start=None, stop=None):
+    '''
+    Stream a D3S csv as blocks of rows, keeping one block in memory
+
+    Arguments are as for read_spectra, chunk_rows being the number of
+    rows in each block.
+
+    Yields, for every block of rows in file order:
+      - int64 array of UTC epoch seconds, sorted within the block
+      - uint32 array of counts (rows x channels)
+      - tzinfo of the last timestamp in the block
+    '''
+    start_key = _time_key(start, -PUSHDOWN_MARGIN)
+    stop_key = _time_key(stop, PUSHDOWN_MARGIN)
+    offset = 0
+    if start_key is not None and isinstance(source, str) and \
+       os.path.isfile(source) and compression(source) is None:
+        offset = seek_time(source, start_key, time_col)
+
+    time_fields = []
+    count_fields = []
+    line_numbers = []
+    lines = iter_lines(source, offset)
+    try:
+        for number, line in enumerate(lines, 1):
+            fields = line.split(',', first_channel)
+            if len(fields) <= first_channel or \
+               not fields[time_col].strip()[:1].isdigit():
+                # blank, truncated or header line
+                continue
+            time_field = fields[time_col].strip()
+            if _is_local_time(time_field):
+                if start_key is not None and \
+                   time_field[:LOCAL_WIDTH] < start_key:
+                    continue
+                if stop_key is not None and \
+                   time_field[:LOCAL_WIDTH] > stop_key:
+                    break
+            time_fields.append(time_field)
+            count_fields.append(fields[first_channel])
+            line_numbers.append(number)
+            if len(time_fields) == chunk_rows:
+                yield _sorted_block(time_fields, _parse_counts( \
+                    count_fields, nchannels, line_numbers, time_fields))
+                time_fields = []
+                count_fields = []
+                line_numbers = []
+    finally:
+        lines.close()
+    if time_fields:
+        yield _sorted_block(time_fields, _parse_counts( \
+            count_fields, nchannels, line_numbers, time_fields))
+
+def _parse_counts(count_fields, nchannels, line_numbers, time_fields):
+    # uint32 matrix of the first nchannels counts of every row, a row
+    # with fewer counts or a field that is not a count raises ValueError
+    usecols = range(nchannels)
+    try:
+        return np.loadtxt(count_fields, delimiter=',', dtype=np.uint32,
+                          usecols=usecols, ndmin=2)
+    except ValueError:
+        pass
+    # name the first bad row
+    for field, number, time_field in zip(count_fields, line_numbers,
+                                         time_fields):
+        try:
+            np.loadtxt([field], delimiter=',', dtype=np.uint32,
+                       usecols=usecols, ndmin=2)
+        except ValueError as error:
+            raise ValueError('bad counts in line {} ({}), expected {} '
+                             'channels: {}'.format(number, time_field,
+                                                   nchannels, error))
+    raise ValueError('bad counts in lines {}-{}'.format(line_numbers[0],
+                                                        line_numbers[-1]))
+
+def _sorted_block(time_fields, spectra):
+    times, datatz = parse_times(time_fields)
+    order = sort_index(times)
+    if order is not None:
+        times = times[order]
+        spectra = spectra[order]
+    return times, spectra, datatz
+
+def read_spectra(source, time_col=TIME_COL, first_channel=FIRST_CHANNEL,
+                 nchannels=NCHANNELS, chunk_rows=4096, start=None, stop=None):
+    '''
+    Stream a D3S csv into columnar arrays
+
+    Arguments:
+      - source: local path, url, or iterable of csv lines
+      - time_col: column holding the row timestamp
+      - first_channel: column holding the counts of channel 0
+      - nchannels: number of channels to keep per row, a row with fewer
+        counts (or a field that is not a count) raises ValueError naming
+        its line
+      - chunk_rows: number of rows converted at a time
+      - start/stop: optional window in the wall-clock time of the file
+        (datetime or string). Rows well outside it are not parsed and
+        reading stops once the rows are past stop; the result can still
+        hold up to PUSHDOWN_MARGIN either side of the window.
+
+    Returns:
+      - sorted int64 array of UTC epoch seconds (one per row)
+      - uint32 array of counts (rows x channels)
+      - tzinfo of the last timestamp in the file
+    '''
+    # one matrix grown in place (realloc) as blocks come in, so memory
+    # holds the rows once plus one block rather than every block and
+    # their concatenation
+    spectra = np.zeros((0, nchannels), dtype=np.uint32)
+    times = []
+    nrows = 0
+    datatz = None
+    for block_times, block, datatz in iter_spectra(source, time_col,
+                                                   first_channel, nchannels,
+                                                   chunk_rows, start, stop):
+        if nrows + len(block) > len(spectra):
+            spectra.resize((max(2*len(spectra), nrows + len(block)),
+                            nchannels), refcheck=False)
+        spectra[nrows:nrows+len(block)] = block
+        times.append(block_times)
+        nrows += len(block)
+    spectra.resize((nrows, nchannels), refcheck=False)
+    if datatz is None:
+        times, datatz = parse_times([])
+        return times, spectra, datatz
+    times = np.concatenate(times)
+    order = sort_index(times)
+    if order is not None:
+        times = times[order]
+        spectra = spectra[order]
+    return times, spectra, datatz
+
+def load_spectra(source, start=None, stop=None, **kwargs):
+    '''
+    Get times, spectra and tzinfo from either an archive or a csv/url
+      - start/stop: optional window in the wall-clock time of the data,
+        an archive is cut exactly to it, a csv up to PUSHDOWN_MARGIN
+        either side of it (see read_spectra)
+      - keyword arguments are passed on to read_spectra for csv input
+    '''
+    if not is_archive(source):
+        return read_spectra(source, start=start, stop=stop, **kwargs)
+    times, spectra, datatz = open_archive(source)
+    if start is not None or stop is not None:
+        tstart = np.iinfo(np.int64).min if start is None else \
+            to_epoch(start, datatz)
+        tstop = np.iinfo(np.int64).max if stop is None else \
+            to_epoch(stop, datatz)
+        window = window_slice(times, tstart, tstop)
+        times, spectra = times[window], spectra[window]
+    return times, spectra, datatz
+
+def seek_time(path, key, time_col=TIME_COL):
+    '''
+    Byte offset of the first row of a local csv at or after a given time
+      - key: 'YYYY-MM-DD HH:MM:SS' wall-clock time of the file
+      - bisects the file, reading one row per step
+      - 0 if the file does not hold local time strings
+    '''
+    with open(path, 'rb') as f:
+        lo, hi = 0, os.fstat(f.fileno()).st_size
+        while lo < hi:
+            mid = (lo + hi)//2
+            row_key = _next_row_key(f, mid, time_col)
+            if row_key is None:
+                return 0
+            if row_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0
+        f.seek(lo)
+        f.readline()
+        return f.tell()
+
+def _next_row_key(f, offset, time_col):
+    # time of the first row starting after offset: header and other
+    # non-time rows sort first, the end of the file sorts last, None
+    # for rows whose time is not a local time string
+    f.seek(offset)
+    if offset:
+        f.readline()
+    line = f.readline()
+    if not line.strip():
+        return '\uffff'
+    fields = line.decode('utf-8', 'replace').split(',', time_col + 1)
+    if len(fields) <= time_col or not fields[time_col].strip()[:1].isdigit():
+        return ''
+    field = fields[time_col].strip()
+    return field[:LOCAL_WIDTH] if _is_local_time(field) else None
+
+def _is_local_time(field):
+    return len(field) >= LOCAL_WIDTH and field[4] == '-' and field[10] == ' '
+
+def _time_key(time, margin):
+    if time is None:
+        return None
+    if isinstance(time, str):
+        time = parse(time)
+    return '{:%Y-%m-%d %H:%M:%S}'.format(time.replace(tzinfo=None) + margin)
+
+#--------------------------------------------------------------------------#
+# Local mirror of a remote csv
+#--------------------------------------------------------------------------#
+def mirror_csv(url, local_path, time_col=TIME_COL, session=None):
+    '''
+    Bring a local copy of an append-only csv up to date
+
+    The request is conditional on the stored ETag/Last-Modified and only
+    asks for the bytes past the end of the local copy, plus SYNC_OVERLAP
+    bytes to check that nothing before them changed. The new tail is
+    appended. If the server ignores the range or the overlap no longer
+    matches, the whole file is downloaded again.
+
+    Metadata (etag, last_modified, length, last_timestamp) is kept in
+    local_path + '.json'.
+
+    Arguments:
+      - url of the csv and path of the local copy
+      - time_col: column of the timestamp recorded as last_timestamp
+      - session: optional requests.Session to fetch with, reusing its
+        connections (urllib otherwise)
+
+    Returns:
+      - number of bytes downloaded
+    '''
+    meta_path = local_path + '.json'
+    meta = {}
+    if os.path.exists(local_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('length') != os.path.getsize(local_path):
+            meta = {}
+
+    headers = {}
+    overlap = 0
+    if meta:
+        overlap = min(meta['length'], SYNC_OVERLAP)
+        headers['Range'] = 'bytes={}-'.format(meta['length'] - overlap)
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    status, response_headers, body = _fetch(url, headers, session)
+    if status == 304:
+        return 0
+    if status == 206 and _matches_tail(local_path, response_headers,
+                                       body, overlap):
+        with open(local_path, 'ab') as f:
+            f.write(body[overlap:])
+    else:
+        if status != 200:
+            # range refused (local copy longer than the remote file) or
+            # the file was rewritten: start over
+            status, response_headers, body = _fetch(url, {}, session)
+        with open(local_path, 'wb') as f:
+            f.write(body)
+
+    meta = {
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+        'length': os.path.getsize(local_path),
+        'last_timestamp': _last_field(local_path, time_col),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return len(body)
+
+def _fetch(url, headers, session=None):
+    '''
+    GET url with the request headers, through session if given
+      - 304 (not modified) and 416 (range not satisfiable) are returned,
+        other http errors are raised
+
+    Returns:
+      - status code, response headers and body
+    '''
+    if session is not None:
+        response = session.get(url, headers=headers)
+        if response.status_code not in (304, 416):
+            response.raise_for_status()
+        return response.status_code, response.headers, response.content
+    try:
+        response = urlopen(Request(url, headers=headers))
+    except HTTPError as e:
+        if e.code in (304, 416):
+            return e.code, e.headers, b''
+        raise
+    with response:
+        return response.status, response.headers, response.read()
+
+def _matches_tail(local_path, headers, body, overlap):
+    length = os.path.getsize(local_path)
+    content_range = headers.get('Content-Range', '')
+    if not content_range.startswith('bytes {}-'.format(length - overlap)):
+        return False
+    with open(local_path, 'rb') as f:
+        f.seek(length - overlap)
+        return body[:overlap] == f.read(overlap)
+
+def _last_field(local_path, col):
+    # a D3S row is a few kB, read enough of the end to hold a full one
+    with open(local_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4*PAGE_SIZE))
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    if len(lines) < 2:
+        return None
+    fields = lines[-1].decode('utf-8').split(',')
+    return fields[col] if len(fields) > col else None
+
+#--------------------------------------------------------------------------#
+# Rows appended to a local csv
+#--------------------------------------------------------------------------#
+def file_stamp(path):
+    '''
+    Size and modification time of a local file
+      - taken before the file is read, a cache of the rows read can tell
+        later whether the file changed since (see is_unchanged and
+        read_appended)
+    '''
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def is_unchanged(path, meta):
+    '''
+    Check whether a local file has the size and mtime stamped in meta
+    '''
+    stamp = file_stamp(path)
+    return meta.get('size') == stamp['size'] and \
+        meta.get('mtime') == stamp['mtime']
+
+def read_appended(path, meta, **kwargs):
+    '''
+    Read only the rows appended to a local csv since it was stamped
+
+    Arguments:
+      - path of the csv
+      - meta: dict with the 'size' (see file_stamp) of the file and the
+        'last_time' (UTC epoch) of the rows read from it then
+      - keyword arguments are passed on to read_spectra
+
+    Returns:
+      - times, spectra and tzinfo of the rows past the stamped size
+      - None if the file has to be read whole again: it is compressed or
+        an archive, shorter than before, did not end on a full row, or
+        the rows past it are not later than the last one read
+    '''
+    size = meta.get('size')
+    if size is None or os.path.getsize(path) < size or \
+       compression(path) is not None or is_archive(path):
+        return None
+    if size > 0:
+        with open(path, 'rb') as f:
+            f.seek(size - 1)
+            if f.read(1) != b'\n':
+                return None
+    times, spectra, datatz = read_spectra(iter_lines(path, size), **kwargs)
+    if len(times) and meta.get('last_time') is not None and \
+       times[0] <= meta['last_time']:
+        return None
+    return times, spectra, datatz
+
+def utc_offset(times, tzinfo):
+    '''
+    Utc offset (s) of tzinfo at the last of the times, 0 without either
+    '''
+    if tzinfo is None or len(times) == 0:
+        return 0
+    return int(from_epoch(times[-1], tzinfo).utcoffset().total_seconds())
+
+def offset_tzinfo(offset):
+    '''
+    Fixed offset tzinfo of a utc offset (s) saved by utc_offset
+    '''
+    return tzoffset(None, offset) if offset else utc
+
+#--------------------------------------------------------------------------#
+# Binary archive
+#--------------------------------------------------------------------------#
+def is_archive(path):
+    '''
+    Check whether path is a local (possibly compressed) spectrum archive
+    '''
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return open_stream(f).read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+def write_archive(path, times, spectra, tzinfo=None):
+    '''
+    Write times and spectra into a memory-mappable archive
+
+    Arguments:
+      - path of the archive to create, compressed with gzip, bz2 or xz if
+        it ends in .gz, .bz2 or .xz
+      - UTC epoch times and matrix of spectra (see read_spectra)
+      - tzinfo of the data, saved as a fixed utc offset
+    '''
+    times = np.ascontiguousarray(times, dtype=np.int64)
+    nrows, nchannels = spectra.shape
+    offset = utc_offset(times, tzinfo)
+    times_offset = ARCHIVE_HEADER_SIZE
+    counts_offset = times_offset + times.nbytes
+    counts_offset += -counts_offset % PAGE_SIZE
+
+    codec = COMPRESSED_EXTENSIONS.get(os.path.splitext(path)[1])
+    with (codec or io).open(path, 'wb') as f:
+        header = ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, nrows, nchannels, offset,
+                                     times_offset, counts_offset)
+        f.write(header.ljust(ARCHIVE_HEADER_SIZE, b'\0'))
+        f.write(times.tobytes())
+        f.write(b'\0'*(counts_offset - times_offset - times.nbytes))
+        # write blocks of rows so a mapped input is never copied whole
+        for i in range(0, nrows, PAGE_SIZE):
+            block = np.ascontiguousarray(spectra[i:i+PAGE_SIZE], dtype=np.uint32)
+            f.write(block.tobytes())
+
+def open_archive(path):
+    '''
+    Memory-map a spectrum archive
+      - a compressed archive is decompressed into memory instead
+
+    Returns:
+      - read-only memory maps of the time index and of the spectra
+      - tzinfo of the data
+    '''
+    codec = compression(path)
+    if codec is None:
+        with open(path, 'rb') as f:
+            header = f.read(ARCHIVE_HEADER.size)
+    else:
+        with codec.open(path, 'rb') as f:
+            data = f.read()
+        header = data[:ARCHIVE_HEADER.size]
+    magic, nrows, nchannels, offset, times_offset, counts_offset = \
+        ARCHIVE_HEADER.unpack(header)
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError('{} is not a spectrum archive'.format(path))
+    datatz = offset_tzinfo(offset)
+    if nrows == 0:
+        return np.zeros(0, np.int64), np.zeros((0, nchannels), np.uint32), datatz
+    if codec is not None:
+        times = np.frombuffer(data, dtype=np.int64, count=nrows,
+                              offset=times_offset)
+        spectra = np.frombuffer(data, dtype=np.uint32, count=nrows*nchannels,
+                                offset=counts_offset)
+        return times, spectra.reshape(nrows, nchannels), datatz
+    times = np.memmap(path, dtype=np.int64, mode='r',
+                      offset=times_offset, shape=(nrows,))
+    spectra = np.memmap(path, dtype=np.uint32, mode='r',
+                        offset=counts_offset, shape=(nrows, nchannels))
+    return times, spectra, datatz
+
+def csv_to_archive(source, path, **kwargs):
+    '''
+    Convert a D3S csv (local path or url) into a spectrum archive
+      - keyword arguments are passed on to read_spectra
+    '''
+    times, spectra, datatz = read_spectra(source, **kwargs)
+    write_archive(path, times, spectra, datatz)
+    return len(times)
+
+if __name__ == '__main__':
+    nrows = csv_to_archive(sys.argv[1], sys.argv[2])
+    print('wrote {} spectra to {}'.format(nrows, sys.argv[2]))
@@ -0,0 +1,296 @@
+'''
+Multi-resolution pyramid of pre-summed D3S spectra.
+
+The raw (5 minute) spectra are summed into hour bins, hours into days and
+days into weeks. Bins are half-open [start, start + width) and aligned to
+local midnight on a Monday in the time zone of the data, so every coarser
+bin is an exact union of finer ones. For each level the pyramid keeps
+  - int64 bin start times (UTC epoch seconds, only bins holding data)
+  - uint64 summed spectra (bins x channels)
+  - int64 number of raw rows in each bin
+
+A query for windows of some width picks the coarsest level whose bins
+exactly tile the windows, so a year of daily spectra is a few hundred
+bins instead of 100k raw rows.
+
+The pyramid of a data file is kept next to it, in <data path>.pyramid/,
+and brought up to date incrementally when rows have been appended. The
+rows of a csv are kept there too, so the csv is only parsed again when
+it changes (and then only the rows appended to it):
+    pyramid = spectra_pyramid.open_pyramid('lbl_outside_d3s.d3s')
+    starts, daily, nrows = spectra_pyramid.pyramid_windows(pyramid,
+        None, None, 86400)
+'''
+import json
+import os
+import sys
+import numpy as np
+
+import spectra_io
+import spectra_windows
+import time_buckets
+import time_index
+
+# name and width (s) of each level, finest first
+LEVELS = (
+    ('hour', 3600),
+    ('day', 86400),
+    ('week', 7*86400),
+)
+PYRAMID_SUFFIX = '.pyramid'
+# archive of the rows of a csv, kept in the pyramid directory
+RAW_ARCHIVE = 'raw.d3s'
+
+# local midnight starting Monday 1970-01-05, in wall-clock seconds
+MONDAY = 4*86400
+
+#--------------------------------------------------------------------------#
+# Building
+#--------------------------------------------------------------------------#
+def aggregate(starts, spectra, nrows, origin, width):
+    '''
+    Sum consecutive rows falling into the same width bin
+
+    Arguments:
+      - sorted UTC epoch times (or bin starts) of the rows
+      - matrix of spectra and number of raw rows behind each row
+      - origin and width of the bins (s)
+
+    Returns:
+      - bin starts, uint64 summed spectra and raw row counts of the bins
+        holding data
+    '''
+    if len(starts) == 0:
+        return np.zeros(0, np.int64), \
+            np.zeros((0, spectra.shape[1]), np.uint64), np.zeros(0, np.int64)
+    bins = (np.asarray(starts) - origin)//width
+    first = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    last = np.append(first[1:], len(bins))
+    counts = np.add.reduceat(np.asarray(nrows, dtype=np.int64), first)
+    return origin + bins[first]*width, \
+        spectra_windows.integrate_rows(spectra, first, last), counts
+
+def build_pyramid(times, spectra, datatz, pyramid=None, nrows_done=0):
+    '''
+    Sum the spectra into every level of the pyramid
+
+    Arguments:
+      - sorted UTC epoch times, matrix of spectra and tzinfo of the data
+      - pyramid: optional pyramid of the first nrows_done rows, only the
+        bins from the last one it holds on are recomputed
+
+    Returns:
+      - pyramid: dict with the raw 'times'/'spectra', the bin 'origin' and
+        (starts, spectra, nrows) for each level name
+    '''
+    # bins are fixed length, so they follow the wall clock of a fixed utc
+    # offset such as the one read_spectra gives
+    origin = int(time_buckets.local_to_epoch([MONDAY], datatz)[0])
+    if pyramid is None or pyramid['origin'] != origin:
+        pyramid, nrows_done = None, 0
+
+    result = {'times': times, 'spectra': spectra, 'origin': origin}
+    # rows of the level below that changed: raw rows first
+    below = (times, spectra, np.ones(len(times), dtype=np.int64))
+    changed = nrows_done
+    for name, width in LEVELS:
+        level_starts, level_spectra, level_nrows = below
+        keep = 0
+        if pyramid is not None and changed > 0:
+            old_starts, old_spectra, old_nrows = pyramid[name]
+            # the last old bin may have been partial: redo it
+            redo = origin + (level_starts[changed] - origin)//width*width \
+                if changed < len(level_starts) else None
+            keep = len(old_starts) if redo is None else \
+                int(np.searchsorted(old_starts, redo))
+            changed = len(level_starts) if redo is None else \
+                int(np.searchsorted(level_starts, redo))
+        new = aggregate(level_starts[changed:], level_spectra[changed:],
+                        level_nrows[changed:], origin, width)
+        if keep > 0:
+            new = tuple(np.concatenate((old[:keep], part))
+                        for old, part in zip(pyramid[name], new))
+        result[name] = new
+        below = new
+        changed = keep
+    return result
+
+#--------------------------------------------------------------------------#
+# Storage
+#--------------------------------------------------------------------------#
+def pyramid_path(path):
+    '''
+    Directory holding the pyramid of a data file
+    '''
+    return path + PYRAMID_SUFFIX
+
+def write_pyramid(path, pyramid, stamp=None):
+    '''
+    Save the levels of a pyramid next to the data file at path
+      - stamp: size and mtime of the data file when it was read (see
+        spectra_io.file_stamp), now by default
+    '''
+    directory = pyramid_path(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name, width in LEVELS:
+        for field, values in zip(('starts', 'spectra', 'nrows'), pyramid[name]):
+            # replace rather than overwrite files that may still be mapped
+            level_path = os.path.join(directory, '{}_{}.npy'.format(name, field))
+            np.save(level_path + '.tmp.npy', values)
+            os.replace(level_path + '.tmp.npy', level_path)
+    times = pyramid['times']
+    meta = dict(stamp or spectra_io.file_stamp(path))
+    meta.update({
+        'origin': pyramid['origin'],
+        'nrows': len(times),
+        'last_time': int(times[-1]) if len(times) else None,
+    })
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+def read_pyramid(path):
+    '''
+    Memory-map the saved levels of a pyramid
+
+    Returns:
+      - pyramid without the raw rows, and the meta data it was saved with
+      - None, None if there is no saved pyramid
+    '''
+    directory = pyramid_path(path)
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    pyramid = {'origin': meta['origin']}
+    for name, width in LEVELS:
+        pyramid[name] = tuple(
+            np.load(os.path.join(directory, '{}_{}.npy'.format(name, field)),
+                    mmap_mode='r')
+            for field in ('starts', 'spectra', 'nrows'))
+    return pyramid, meta
+
+def open_pyramid(path, **kwargs):
+    '''
+    Open a data file (csv or archive) with its pyramid, building the
+    pyramid if it is missing and extending it if rows were appended
+      - an archive is memory-mapped
+      - the rows of a csv are kept with its pyramid, as an archive: an
+        unchanged csv (same size and mtime as in the pyramid meta) is not
+        parsed again, and of a csv that was appended to only the new rows
+        are (see spectra_io.read_appended)
+      - keyword arguments (csv layout) are passed on to
+        spectra_io.read_spectra; the pyramid always covers the whole file
+
+    Returns:
+      - pyramid (see build_pyramid)
+    '''
+    old, meta = read_pyramid(path)
+    stamp = spectra_io.file_stamp(path)
+    if spectra_io.is_archive(path):
+        times, spectra, datatz = spectra_io.open_archive(path)
+    else:
+        times, spectra, datatz = _csv_rows(path, meta, **kwargs)
+    nrows_done = 0
+    if meta is not None and 0 < meta['nrows'] <= len(times) and \
+       int(times[meta['nrows']-1]) == meta['last_time']:
+        nrows_done = meta['nrows']
+        if nrows_done == len(times):
+            old.update(times=times, spectra=spectra)
+            return old
+    pyramid = build_pyramid(times, spectra, datatz, old, nrows_done)
+    write_pyramid(path, pyramid, stamp)
+    return pyramid
+
+def _csv_rows(path, meta, **kwargs):
+    # rows of a csv from the archive kept with its pyramid, with the rows
+    # appended to the csv since; the whole csv is read if need be
+    raw_path = os.path.join(pyramid_path(path), RAW_ARCHIVE)
+    if meta is not None and os.path.exists(raw_path):
+        times, spectra, datatz = spectra_io.open_archive(raw_path)
+        if len(times) == meta['nrows']:
+            if spectra_io.is_unchanged(path, meta):
+                return times, spectra, datatz
+            appended = spectra_io.read_appended(path, meta, **kwargs)
+            if appended is not None and \
+               appended[1].shape[1] == spectra.shape[1]:
+                new_times, new_spectra, new_datatz = appended
+                if len(new_times) == 0:
+                    return times, spectra, datatz
+                return _save_rows(raw_path,
+                                  np.concatenate((times, new_times)),
+                                  np.concatenate((spectra, new_spectra)),
+                                  new_datatz)
+    times, spectra, datatz = spectra_io.read_spectra(path, **kwargs)
+    directory = pyramid_path(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return _save_rows(raw_path, times, spectra, datatz)
+
+def _save_rows(raw_path, times, spectra, datatz):
+    # replace the archive of the csv rows and map it
+    spectra_io.write_archive(raw_path + '.tmp', times, spectra, datatz)
+    os.replace(raw_path + '.tmp', raw_path)
+    return spectra_io.open_archive(raw_path)
+
+#--------------------------------------------------------------------------#
+# Queries
+#--------------------------------------------------------------------------#
+def tiling_level(pyramid, tstart, width):
+    '''
+    Name of the coarsest level whose bins exactly tile windows of width
+    seconds starting at tstart (epoch), None if only raw rows do
+    '''
+    best = None
+    for name, level_width in LEVELS:
+        if width % level_width == 0 and \
+           (tstart - pyramid['origin']) % level_width == 0:
+            best = name
+    return best
+
+def pyramid_windows(pyramid, tstart, tstop, width):
+    '''
+    Summed spectra of consecutive [start, start + width) windows
+
+    Arguments:
+      - pyramid from open_pyramid or build_pyramid
+      - tstart/tstop as aware datetimes or epoch seconds, None for the
+        start (aligned to the bins) and end of the data
+      - width of the windows in seconds
+
+    Returns:
+      - int64 window starts (UTC epoch seconds)
+      - uint64 summed spectra (windows x channels)
+      - int64 number of raw rows in each window
+    '''
+    times = pyramid['times']
+    width = int(width)
+    if tstart is None:
+        tstart = pyramid['origin'] + \
+            (int(times[0]) - pyramid['origin'])//width*width
+    elif not isinstance(tstart, (int, np.integer)):
+        tstart = time_index.to_epoch(tstart)
+    if tstop is None:
+        tstop = int(times[-1]) + 1
+    elif not isinstance(tstop, (int, np.integer)):
+        tstop = time_index.to_epoch(tstop)
+    nwindows = max(0, -(-(tstop - tstart)//width))
+    starts = tstart + width*np.arange(nwindows, dtype=np.int64)
+
+    name = tiling_level(pyramid, tstart, width)
+    if name is None:
+        level_starts, level_spectra = times, pyramid['spectra']
+        level_nrows = np.ones(len(times), dtype=np.int64)
+    else:
+        level_starts, level_spectra, level_nrows = pyramid[name]
+    first = np.searchsorted(level_starts, starts, side='left')
+    last = np.searchsorted(level_starts, starts + width, side='left')
+    nrows = np.concatenate(([0], np.cumsum(level_nrows)))
+    return starts, spectra_windows.integrate_rows(level_spectra, first, last), \
+        nrows[last] - nrows[first]
+
+if __name__ == '__main__':
+    pyramid = open_pyramid(sys.argv[1])
+    for name, width in LEVELS:
+        print('{:>5}: {} bins'.format(name, len(pyramid[name][0])))
@@ -0,0 +1,550 @@
+'''
+Integration of D3S spectra over time windows.
+
+The window edges are computed once (see time_buckets) and every row is
+assigned to its window with one np.searchsorted over all of them; the
+windows are then summed by np.add.reduceat, a block of rows at a time.
+
+When the same data is integrated over and over (different nhours or
+start/stop), a prefix-sum index saves re-reading it: row i of the index
+is the sum of the first i spectra, so any window is the difference of
+two index rows. The index is kept next to the data file in
+<data path>.prefix.npy and memory-mapped; for a csv the row times and the
+size/mtime of the file are kept with it, so the csv is only parsed again
+when it changes (and then only the rows appended to it):
+    index = spectra_windows.open_index('lbl_outside_d3s.d3s')
+    counts, nrows = spectra_windows.integrate(index, '2017-06-01',
+                                              '2017-06-02')
+
+Files too large to load can be streamed instead, one window at a time:
+    for start, mid, nrows, counts in spectra_windows.stream_windows(
+            'lbl_outside_d3s.csv', 4):
+        ...
+'''
+import json
+import os
+import sys
+import numpy as np
+from datetime import timedelta
+
+import reliability
+import spectra_io
+import time_buckets
+import time_index
+
+INDEX_SUFFIX = '.prefix.npy'
+# times of the indexed rows and the stamp of the file they were read from
+INDEX_TIMES_SUFFIX = '.prefix.times.npy'
+INDEX_META_SUFFIX = '.prefix.json'
+
+def integrate_rows(spectra, first, last, out=None, chunk_rows=256):
+    '''
+    Sum the rows first[i]:last[i] of the spectra for every window i
+
+    The windows are summed by np.add.reduceat, one call per block of
+    about chunk_rows rows: reduceat reads its rows as uint64, so blocks
+    keep that copy small (and a mapped input from being read whole).
+
+    Arguments:
+      - matrix of spectra (rows x channels)
+      - arrays of first row and row past the end of each window
+      - out: optional uint64 array (windows x channels) to sum into
+      - chunk_rows: number of rows reduced at a time
+
+    Returns:
+      - uint64 array of integrated spectra (windows x channels)
+    '''
+    first = np.asarray(first, dtype=np.int64)
+    last = np.asarray(last, dtype=np.int64)
+    integrated = out
+    if integrated is None:
+        integrated = np.zeros((len(first), spectra.shape[1]), dtype=np.uint64)
+    else:
+        integrated[...] = 0
+    # reduceat gives the first row for an empty window: reduce only the
+    # windows holding rows
+    full = np.flatnonzero(last > first)
+    full = full[np.argsort(first[full], kind='stable')]
+    blocks = np.flatnonzero(np.diff(first[full]//chunk_rows)) + 1
+    for windows in np.split(full, blocks):
+        if len(windows) == 0:
+            continue
+        lo = first[windows].min()
+        hi = last[windows].max()
+        integrated[windows] = _reduce_windows(spectra[lo:hi],
+                                              first[windows] - lo,
+                                              last[windows] - lo)
+    return integrated
+
+def _reduce_windows(block, first, last):
+    # sums of block[first[i]:last[i]] (uint64), every window holding rows
+    sums = np.empty((len(first), block.shape[1]), dtype=np.uint64)
+    inner = last < len(block)
+    if inner.any():
+        # interleaved bounds: the even segments are the windows, the odd
+        # ones the rows between two windows
+        bounds = np.column_stack((first[inner], last[inner])).ravel()
+        sums[inner] = np.add.reduceat(block, bounds, axis=0,
+                                      dtype=np.uint64)[::2]
+    if not inner.all():
+        # the end of the block is not a valid bound: windows running to it
+        # are summed back from the end over the segments between their starts
+        starts, inverse = np.unique(first[~inner], return_inverse=True)
+        segments = np.add.reduceat(block[starts[0]:], starts - starts[0],
+                                   axis=0, dtype=np.uint64)
+        sums[~inner] = np.cumsum(segments[::-1], axis=0,
+                                 dtype=np.uint64)[::-1][inverse.ravel()]
+    return sums
+
+def window_spectra(times, spectra, nhours, tstart, tstop, prefix=None,
+                   min_coverage=0, normalize=False):
+    '''
+    Integrate the spectra over every nhours window between tstart and tstop
+
+    Arguments:
+      - sorted UTC epoch times and matrix of spectra
+        (see spectra_io.read_spectra)
+      - number of hours to integrate over
+      - start/stop times (aware datetimes)
+      - prefix: optional prefix sums of the same rows (see prefix_sums),
+        each window is then two row lookups instead of a sum over its rows
+      - min_coverage: windows with a smaller fraction of their length
+        covered by data are left out (see reliability.window_coverage)
+      - normalize: scale the counts of each window to its full length
+
+    Returns:
+      - list of window times (time of the middle row of each window)
+      - uint64 array of integrated spectra (windows x channels), float64
+        if normalized
+      - empty and low coverage windows are left out of both
+    '''
+    starts, stops = time_buckets.day_windows(tstart, tstop, nhours)
+    first, last = time_index.window_rows(times, starts, stops)
+    live_time, coverage = reliability.window_coverage( \
+        first, last, starts, stops, reliability.row_seconds(times))
+    full = (last > first) & (coverage >= min_coverage)
+    first, last, coverage = first[full], last[full], coverage[full]
+    middle = first + (last - first)//2
+    window_times = [time_index.from_epoch(t, tstart.tzinfo)
+                    for t in times[middle]]
+    if prefix is not None:
+        integrated = prefix[last] - prefix[first]
+    else:
+        integrated = integrate_rows(spectra, first, last)
+    if normalize:
+        integrated = integrated/coverage[:, None]
+    return window_times, integrated
+
+def window_midpoints(times, spectra, nhours, tstart, tstop):
+    '''
+    Matched window midpoints, row counts and integrated spectra of every
+    nhours window between tstart and tstop holding data
+
+    Rows are assigned to windows by their timestamps, so missing or extra
+    rows only change the windows they fall in.
+
+    Arguments:
+      - sorted UTC epoch times and matrix of spectra
+        (see spectra_io.read_spectra), spectra can be None for the
+        midpoints and row counts only
+      - number of hours to integrate over
+      - start/stop times (aware datetimes)
+
+    Returns:
+      - int64 midpoint of each window (halfway between its first and
+        last row, UTC epoch seconds)
+      - number of rows in each window
+      - uint64 array of integrated spectra (windows x channels), None
+        without spectra
+    '''
+    starts, stops = time_buckets.day_windows(tstart, tstop, nhours)
+    first, last = time_index.window_rows(times, starts, stops)
+    full = last > first
+    first, last = first[full], last[full]
+    midpoints = (times[first] + times[last - 1])//2
+    integrated = None
+    if spectra is not None:
+        integrated = integrate_rows(spectra, first, last)
+    return midpoints, last - first, integrated
+
+def rolling_spectra(times, spectra, nhours, step_minutes, tstart, tstop,
+                    row_seconds=None, min_coverage=0):
+    '''
+    Integrate the spectra over overlapping nhours windows, one starting
+    every step_minutes between tstart and tstop
+
+    A running sum is kept from one window to the next: the rows entering
+    the window are added and the rows leaving it subtracted, so every row
+    is read twice at most whatever the overlap. After a gap longer than
+    the window the sum is started over.
+
+    Arguments:
+      - sorted UTC epoch times and matrix of spectra
+        (see spectra_io.read_spectra)
+      - number of hours in each window and minutes between window starts
+      - start/stop times (aware datetimes), windows end by tstop
+      - row_seconds: time covered by one row, by default the median
+        spacing of the times
+      - min_coverage: windows with a smaller fraction of their length
+        covered by data are not yielded
+
+    Yields, for every window holding data:
+      - window time (time of the middle row)
+      - uint64 array of integrated counts per channel
+      - live time of the window in seconds (rows x row_seconds)
+    '''
+    if row_seconds is None:
+        row_seconds = reliability.row_seconds(times)
+    width = int(nhours*3600)
+    step = int(step_minutes*60)
+    epoch_start = time_index.to_epoch(tstart)
+    nwindows = max(0, (time_index.to_epoch(tstop) - epoch_start - width)//step + 1)
+    starts = epoch_start + step*np.arange(nwindows, dtype=np.int64)
+    first, last = time_index.window_rows(times, starts, starts + width)
+    live_time, coverage = reliability.window_coverage( \
+        first, last, starts, starts + width, row_seconds)
+
+    running = np.zeros(spectra.shape[1], dtype=np.uint64)
+    lo = hi = 0
+    for a, b, live, covered in zip(first, last, live_time, coverage):
+        if b == a or covered < min_coverage:
+            continue
+        if a >= hi:
+            running[:] = spectra[a:b].sum(axis=0, dtype=np.uint64)
+        else:
+            # add before subtracting so the unsigned sum never goes negative
+            running += spectra[hi:b].sum(axis=0, dtype=np.uint64)
+            running -= spectra[lo:a].sum(axis=0, dtype=np.uint64)
+        lo, hi = a, b
+        window_time = time_index.from_epoch(times[a + (b - a)//2],
+                                            tstart.tzinfo)
+        yield window_time, running.copy(), live
+
+def station_spectra(stations, nhours, tstart, tstop, prefixes=None, out=None):
+    '''
+    Integrate several stations over one shared grid of nhours windows
+
+    Arguments:
+      - stations: list of (times, spectra, ...) tuples, one per station
+        (e.g. from spectra_io.load_spectra), all with the same channels
+      - number of hours to integrate over
+      - start/stop times (aware datetimes) of the shared windows
+      - prefixes: optional prefix sums of each station's rows (see
+        open_index), every window is then two row lookups
+      - out: optional uint64 array (stations x windows x channels) to fill,
+        e.g. one in shared memory (see shared_arrays.create_array)
+
+    Returns:
+      - int64 window start and stop times (UTC epoch seconds)
+      - uint64 array of integrated spectra (stations x windows x channels)
+      - int64 number of rows of each station in each window
+        (stations x windows), 0 where a station has no data
+    '''
+    starts, stops = time_buckets.day_windows(tstart, tstop, nhours)
+    nchannels = set(station[1].shape[1] for station in stations)
+    if len(nchannels) > 1:
+        raise ValueError('stations have different numbers of channels')
+    nchannels = nchannels.pop() if nchannels else spectra_io.NCHANNELS
+    shape = (len(stations), len(starts), nchannels)
+    integrated = np.zeros(shape, dtype=np.uint64) if out is None else out
+    if integrated.shape != shape:
+        raise ValueError('out must have shape {}'.format(shape))
+    nrows = np.zeros(shape[:2], dtype=np.int64)
+    for i, station in enumerate(stations):
+        first, last = time_index.window_rows(station[0], starts, stops)
+        nrows[i] = last - first
+        if prefixes is not None:
+            integrated[i] = prefixes[i][last] - prefixes[i][first]
+        else:
+            integrate_rows(station[1], first, last, integrated[i])
+    return starts, stops, integrated, nrows
+
+#--------------------------------------------------------------------------#
+# Streaming
+#--------------------------------------------------------------------------#
+def stream_windows(source, nhours, tstart=None, tstop=None, min_coverage=0,
+                   normalize=False, chunk_rows=4096, **kwargs):
+    '''
+    Integrate a D3S csv, url or archive over nhours windows without
+    loading it
+
+    The rows are read a block at a time (see spectra_io.iter_spectra) and
+    summed into every window they fall in, so memory holds one block of
+    rows and the sums of the windows still open whatever the length of the
+    file. Windows are laid out as in window_spectra (see
+    time_buckets.day_windows), overlapping at midnight when nhours does
+    not divide the day. Rows are expected in time order: a row older than
+    the open windows is dropped.
+
+    Arguments:
+      - source: csv path or url, or spectrum archive
+      - number of hours to integrate over
+      - start/stop times (aware datetimes), by default from the midnight
+        before the first row until the end of the data
+      - min_coverage, normalize: as in window_spectra, the coverage of a
+        window being its rows x reliability.ROW_SECONDS over its length
+      - chunk_rows: number of rows read at a time
+      - keyword arguments (csv layout) are passed on to
+        spectra_io.iter_spectra
+
+    Yields, for every window holding data:
+      - window start and window midpoint (halfway between its first and
+        last row), aware datetimes in the time zone of tstart or the data
+      - number of rows in the window
+      - uint64 array of integrated counts per channel, float64 if
+        normalized
+    '''
+    if spectra_io.is_archive(source):
+        blocks = _archive_blocks(source, chunk_rows, tstart)
+    else:
+        blocks = spectra_io.iter_spectra(source, chunk_rows=chunk_rows,
+                                         start=tstart, stop=tstop, **kwargs)
+    windows = None
+    following = None
+    # windows holding rows so far, oldest first: when nhours does not
+    # divide the day the last window of a day overlaps the first of the
+    # next one, so both take the rows they share
+    open_windows = []
+    try:
+        for times, spectra, datatz in blocks:
+            if len(times) == 0:
+                continue
+            if windows is None:
+                if tstart is None:
+                    tstart = time_index.from_epoch(times[0], datatz).replace( \
+                        hour=0, minute=0, second=0)
+                windows = _day_windows(tstart, tstop, nhours)
+                following = next(windows, None)
+            while following is not None and following[0] < times[-1]:
+                start, stop = following
+                running = np.zeros(spectra.shape[1], dtype=np.uint64)
+                open_windows.append([start, stop, 0, None, None, running])
+                following = next(windows, None)
+            for window in open_windows:
+                lo = np.searchsorted(times, window[0], side='right')
+                hi = max(lo, np.searchsorted(times, window[1], side='left'))
+                if hi > lo:
+                    window[5] += spectra[lo:hi].sum(axis=0, dtype=np.uint64)
+                    if window[2] == 0:
+                        window[3] = times[lo]
+                    window[4] = times[hi - 1]
+                    window[2] += hi - lo
+            # a window ending by the last row of the block is complete
+            while open_windows and open_windows[0][1] <= times[-1]:
+                window = _stream_window(open_windows.pop(0), tstart.tzinfo,
+                                        min_coverage, normalize)
+                if window is not None:
+                    yield window
+            if following is None and not open_windows:
+                break
+    finally:
+        blocks.close()
+    for window in open_windows:
+        window = _stream_window(window, tstart.tzinfo, min_coverage,
+                                normalize)
+        if window is not None:
+            yield window
+
+def _stream_window(window, tzinfo, min_coverage, normalize):
+    # the yielded tuple of a finished window [start, stop, nrows,
+    # first_time, last_time, running], None if empty or below min_coverage
+    start, stop, nrows, first_time, last_time, running = window
+    if nrows == 0:
+        return None
+    live_time, coverage = reliability.window_coverage( \
+        0, nrows, start, stop, reliability.ROW_SECONDS)
+    if coverage < min_coverage:
+        return None
+    if normalize:
+        running = running/coverage
+    return time_index.from_epoch(start, tzinfo), \
+        time_index.from_epoch((first_time + last_time)//2, tzinfo), \
+        nrows, running
+
+def _day_windows(tstart, tstop, nhours):
+    # (start, stop) epoch seconds of the day_windows layout, a day at a time
+    day = tstart
+    while tstop is None or day < tstop:
+        next_day = day + timedelta(days=1)
+        starts, stops = time_buckets.day_windows(day, next_day, nhours)
+        for start, stop in zip(starts, stops):
+            yield start, stop
+        day = next_day
+
+def _archive_blocks(path, chunk_rows, tstart=None):
+    # blocks of rows of a mapped archive, from the first row after tstart
+    times, spectra, datatz = spectra_io.open_archive(path)
+    first = 0
+    if tstart is not None:
+        first = int(np.searchsorted(times, time_index.to_epoch(tstart),
+                                    side='right'))
+    for i in range(first, len(times), chunk_rows):
+        yield np.asarray(times[i:i+chunk_rows]), spectra[i:i+chunk_rows], datatz
+
+#--------------------------------------------------------------------------#
+# Prefix-sum index
+#--------------------------------------------------------------------------#
+def prefix_sums(spectra, out=None, carry=None, chunk_rows=spectra_io.PAGE_SIZE):
+    '''
+    Cumulative sums of the spectra down the rows
+
+    Arguments:
+      - matrix of spectra (rows x channels)
+      - out: optional (rows+1) x channels uint64 array to fill
+      - carry: sums to start from (zeros by default)
+
+    Returns:
+      - uint64 array, row i is carry plus the sum of the first i spectra
+    '''
+    nrows, nchannels = spectra.shape
+    if out is None:
+        out = np.zeros((nrows+1, nchannels), dtype=np.uint64)
+    out[0] = 0 if carry is None else carry
+    # chunks keep a mapped input from being copied whole
+    for i in range(0, nrows, chunk_rows):
+        block = np.cumsum(spectra[i:i+chunk_rows], axis=0, dtype=np.uint64)
+        out[i+1:i+1+len(block)] = block + out[i]
+    return out
+
+def index_path(path):
+    '''
+    Path of the prefix-sum index kept next to a data file
+    '''
+    return path + INDEX_SUFFIX
+
+def build_index(path, times, spectra, datatz=None, stamp=None):
+    '''
+    Write the prefix-sum index of a data file, extending an existing one
+    when the data has only been appended to
+      - the times, tzinfo and stamp (see spectra_io.file_stamp, taken
+        before the file was read) are kept with the index, so open_index
+        need not parse an unchanged csv again
+
+    Returns:
+      - read-only memory map of the prefix sums
+    '''
+    prefix_path = index_path(path)
+    old = None
+    if os.path.exists(prefix_path):
+        old = np.load(prefix_path, mmap_mode='r')
+        if not (old.shape[1] == spectra.shape[1] and
+                0 < len(old) - 1 <= len(spectra) and
+                np.array_equal(old[-1] - old[-2], spectra[len(old)-2])):
+            old = None
+    nrows = 0 if old is None else len(old) - 1
+    return _save_index(path, times, spectra[nrows:], datatz, stamp, old)
+
+def _save_index(path, times, spectra, datatz, stamp, old=None):
+    # prefix sums of old ((rows+1) x channels, None for no rows) followed
+    # by those of the spectra, then the times of all rows and the meta
+    prefix_path = index_path(path)
+    nrows = 0 if old is None else len(old) - 1
+    tmp_path = prefix_path + '.tmp'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint64,
+                                    shape=(nrows+len(spectra)+1,
+                                           spectra.shape[1]))
+    if old is not None:
+        out[:nrows+1] = old
+        del old
+    prefix_sums(spectra, out=out[nrows:], carry=out[nrows].copy())
+    out.flush()
+    del out
+    os.replace(tmp_path, prefix_path)
+
+    times_path = path + INDEX_TIMES_SUFFIX
+    np.save(times_path + '.tmp.npy', times)
+    os.replace(times_path + '.tmp.npy', times_path)
+    meta = dict(stamp or spectra_io.file_stamp(path))
+    meta.update(nrows=len(times),
+                last_time=int(times[-1]) if len(times) else None,
+                utc_offset=spectra_io.utc_offset(times, datatz))
+    with open(path + INDEX_META_SUFFIX, 'w') as f:
+        json.dump(meta, f)
+    return np.load(prefix_path, mmap_mode='r')
+
+def open_index(path, **kwargs):
+    '''
+    Open a data file (csv or archive) together with its prefix-sum index,
+    building the index if it is missing and extending it if rows were
+    appended
+      - an archive is memory-mapped, only its header is read
+      - for a csv the times are kept with the index: an unchanged file
+        (same size and mtime) is not parsed at all, and of a file that
+        was appended to only the new rows are
+      - keyword arguments (csv layout) are passed on to
+        spectra_io.read_spectra; the index always covers the whole file
+
+    Returns:
+      - sorted UTC epoch times, read-only memory map of the prefix sums
+        ((rows+1) x channels) and tzinfo of the data
+    '''
+    prefix_path = index_path(path)
+    if spectra_io.is_archive(path):
+        times, spectra, datatz = spectra_io.open_archive(path)
+        if os.path.exists(prefix_path) and \
+           os.path.getmtime(prefix_path) >= os.path.getmtime(path):
+            prefix = np.load(prefix_path, mmap_mode='r')
+            if prefix.shape == (len(times)+1, spectra.shape[1]):
+                return times, prefix, datatz
+        return times, build_index(path, times, spectra, datatz), datatz
+
+    index = _open_csv_index(path, **kwargs)
+    if index is not None:
+        return index
+    stamp = spectra_io.file_stamp(path)
+    times, spectra, datatz = spectra_io.read_spectra(path, **kwargs)
+    return times, build_index(path, times, spectra, datatz, stamp), datatz
+
+def _open_csv_index(path, **kwargs):
+    # index of a csv from the times and meta kept with it, extended with
+    # the rows appended since; None if the csv has to be read whole
+    meta_path = path + INDEX_META_SUFFIX
+    times_path = path + INDEX_TIMES_SUFFIX
+    prefix_path = index_path(path)
+    if not all(os.path.exists(index_file)
+               for index_file in (meta_path, times_path, prefix_path)):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    times = np.load(times_path)
+    prefix = np.load(prefix_path, mmap_mode='r')
+    if len(times) != meta['nrows'] or len(prefix) != len(times) + 1:
+        return None
+    datatz = spectra_io.offset_tzinfo(meta['utc_offset'])
+    if spectra_io.is_unchanged(path, meta):
+        return times, prefix, datatz
+
+    stamp = spectra_io.file_stamp(path)
+    appended = spectra_io.read_appended(path, meta, **kwargs)
+    if appended is None or appended[1].shape[1] != prefix.shape[1]:
+        return None
+    new_times, new_spectra, new_datatz = appended
+    if len(new_times):
+        times = np.concatenate((times, new_times))
+        datatz = new_datatz
+    prefix = _save_index(path, times, new_spectra, datatz, stamp, prefix)
+    return times, prefix, datatz
+
+def integrate(index, tstart, tstop):
+    '''
+    Summed spectrum of the rows strictly between tstart and tstop
+
+    Arguments:
+      - index from open_index
+      - start/stop as datetimes or strings, naive times are taken to be
+        in the time zone of the data
+
+    Returns:
+      - uint64 array of counts per channel
+      - number of rows summed
+    '''
+    times, prefix, datatz = index
+    window = time_index.window_slice(times,
+                                     time_index.to_epoch(tstart, datatz),
+                                     time_index.to_epoch(tstop, datatz))
+    return prefix[window.stop] - prefix[window.start], \
+        window.stop - window.start
+
+if __name__ == '__main__':
+    times, prefix, datatz = open_index(sys.argv[1])
+    print('indexed {} spectra in {}'.format(len(times), index_path(sys.argv[1])))
@@ -0,0 +1,72 @@
+'''
+Checks of spectra_io.mirror_csv against a stand-in http server
+(the csv_server fixture of the repository conftest.py).
+
+Run with pytest from this directory or the repository root:
+    python -m pytest test_spectra_io.py
+'''
+import json
+import os
+import pytest
+
+import spectra_io
+
+def make_rows(first, last):
+    # D3S-like rows, long enough that the overlap is a small part of them
+    return ''.join('{},2017-01-01 00:{:02d}:00-07:00,{}\n'.format(
+        i, i % 60, ','.join(['7']*300)) for i in range(first, last)).encode()
+
+@pytest.fixture(params=['urllib', 'session'])
+def session(request):
+    if request.param == 'urllib':
+        yield None
+        return
+    requests = pytest.importorskip('requests')
+    with requests.Session() as session:
+        yield session
+
+def mirror(csv_server, tmpdir, session):
+    local_path = os.path.join(str(tmpdir), 'd3s.csv')
+    nbytes = spectra_io.mirror_csv(csv_server.url + 'd3s.csv', local_path,
+                                   session=session)
+    with open(local_path, 'rb') as f:
+        assert f.read() == csv_server.files['d3s.csv']
+    return nbytes
+
+def test_mirror_not_modified(csv_server, tmpdir, session):
+    csv_server.files['d3s.csv'] = make_rows(0, 20)
+    assert mirror(csv_server, tmpdir, session) == len(csv_server.files['d3s.csv'])
+    assert mirror(csv_server, tmpdir, session) == 0
+    assert csv_server.statuses() == [200, 304]
+
+def test_mirror_appended_tail(csv_server, tmpdir, session):
+    csv_server.files['d3s.csv'] = make_rows(0, 20)
+    length = len(csv_server.files['d3s.csv'])
+    mirror(csv_server, tmpdir, session)
+    csv_server.files['d3s.csv'] += make_rows(20, 23)
+    added = len(csv_server.files['d3s.csv']) - length
+    # the new rows plus the overlap checked against the local copy
+    assert mirror(csv_server, tmpdir, session) == added + spectra_io.SYNC_OVERLAP
+    assert csv_server.statuses() == [200, 206]
+    range_header = csv_server.requests[-1][1]['Range']
+    assert range_header == 'bytes={}-'.format(length - spectra_io.SYNC_OVERLAP)
+    with open(os.path.join(str(tmpdir), 'd3s.csv.json')) as f:
+        meta = json.load(f)
+    assert meta['last_timestamp'] == '2017-01-01 00:22:00-07:00'
+
+def test_mirror_overlap_mismatch(csv_server, tmpdir, session):
+    csv_server.files['d3s.csv'] = make_rows(0, 20)
+    mirror(csv_server, tmpdir, session)
+    # the last local row rewritten and more appended: the overlap differs
+    csv_server.files['d3s.csv'] = make_rows(0, 19) + \
+        make_rows(19, 20).replace(b'7', b'8') + make_rows(20, 23)
+    assert mirror(csv_server, tmpdir, session) == len(csv_server.files['d3s.csv'])
+    assert csv_server.statuses() == [200, 206, 200]
+
+def test_mirror_shrunk_file(csv_server, tmpdir, session):
+    csv_server.files['d3s.csv'] = make_rows(0, 20)
+    mirror(csv_server, tmpdir, session)
+    # shorter than the range start: 416, then the whole file
+    csv_server.files['d3s.csv'] = make_rows(0, 2)
+    assert mirror(csv_server, tmpdir, session) == len(csv_server.files['d3s.csv'])
+    assert csv_server.statuses() == [200, 416, 200]
@@ -0,0 +1,44 @@
+'''
+Checks that a pyramid kept next to a csv is reopened without parsing the
+csv and extended with only the rows appended to it.
+
+Run with pytest from this directory:
+    python -m pytest test_spectra_pyramid.py
+'''
+import os
+import numpy as np
+
+import spectra_io
+import spectra_pyramid
+from test_spectra_windows import write_csv
+
+def test_open_pyramid_parses_only_new_rows(tmpdir, monkeypatch):
+    csv_path = os.path.join(str(tmpdir), 'd3s.csv')
+    write_csv(csv_path, nrows=600)
+    with open(csv_path) as f:
+        lines = f.read().splitlines(True)
+    with open(csv_path, 'w') as f:
+        f.writelines(lines[:401])
+    spectra_pyramid.open_pyramid(csv_path)
+    with open(csv_path, 'a') as f:
+        f.writelines(lines[401:])
+
+    parsed = []
+    read_spectra = spectra_io.read_spectra
+    def counting_read(source, **kwargs):
+        times, spectra, datatz = read_spectra(source, **kwargs)
+        parsed.append(len(times))
+        return times, spectra, datatz
+    monkeypatch.setattr(spectra_io, 'read_spectra', counting_read)
+    pyramid = spectra_pyramid.open_pyramid(csv_path)
+    again = spectra_pyramid.open_pyramid(csv_path)
+    assert parsed == [len(lines) - 401]
+
+    times, spectra, datatz = read_spectra(csv_path)
+    expected = spectra_pyramid.build_pyramid(times, spectra, datatz)
+    for opened in (pyramid, again):
+        assert np.array_equal(opened['times'], times)
+        assert np.array_equal(opened['spectra'], spectra)
+        for name, width in spectra_pyramid.LEVELS:
+            for values, expected_values in zip(opened[name], expected[name]):
+                assert np.array_equal(values, expected_values)
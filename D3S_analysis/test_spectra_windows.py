@@ -0,0 +1,107 @@
+'''
+Checks that streamed windows match the in-memory ones.
+
+Run with pytest from this directory:
+    python -m pytest test_spectra_windows.py
+'''
+import gzip
+import os
+import numpy as np
+from datetime import datetime, timedelta
+from dateutil.tz import tzoffset
+
+import spectra_io
+import spectra_windows
+
+DATATZ = tzoffset(None, -7*3600)
+
+def write_csv(path, nrows=1000, step=300, seed=0):
+    '''
+    Write a D3S csv of nrows 5 minute rows from 2017-01-01 local midnight,
+    with a gap of a few hours and Poisson counts
+    '''
+    random = np.random.RandomState(seed)
+    offsets = step*np.arange(nrows)
+    offsets = offsets[(offsets < 30*3600) | (offsets >= 34*3600)]
+    spectra = random.poisson(2, (len(offsets), spectra_io.NCHANNELS))
+    start = datetime(2017, 1, 1)
+    header = ['id', 'deviceTime_local'] + ['c{}'.format(i) for i in range(10)] + \
+        ['ch{}'.format(i) for i in range(spectra_io.NCHANNELS)]
+    lines = [','.join(header)]
+    for i, (offset, counts) in enumerate(zip(offsets, spectra)):
+        time = start + timedelta(seconds=int(offset))
+        lines.append('{},{}-07:00,{},{}'.format(
+            i, time.strftime('%Y-%m-%d %H:%M:%S'), ','.join(['0']*10),
+            ','.join(map(str, counts))))
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def compare(source, nhours, chunk_rows):
+    tstart = datetime(2017, 1, 1, tzinfo=DATATZ)
+    tstop = datetime(2017, 1, 5, tzinfo=DATATZ)
+    times, spectra, datatz = spectra_io.load_spectra(source)
+    window_times, integrated = spectra_windows.window_spectra( \
+        times, spectra, nhours, tstart, tstop)
+    streamed = list(spectra_windows.stream_windows( \
+        source, nhours, tstart, tstop, chunk_rows=chunk_rows))
+    assert len(streamed) == len(integrated)
+    nrows = spectra_windows.window_midpoints(times, None, nhours,
+                                             tstart, tstop)[1]
+    for (start, mid, n, counts), expected, expected_rows in \
+            zip(streamed, integrated, nrows):
+        assert n == expected_rows
+        assert np.array_equal(counts, expected)
+
+def check_sources(tmpdir, nhours):
+    csv_path = os.path.join(str(tmpdir), 'd3s.csv')
+    write_csv(csv_path)
+    gz_path = os.path.join(str(tmpdir), 'd3s.csv.gz')
+    write_csv(gz_path)
+    archive_path = os.path.join(str(tmpdir), 'd3s.d3s')
+    spectra_io.csv_to_archive(csv_path, archive_path)
+    for source in (csv_path, gz_path, archive_path):
+        # blocks both shorter and longer than a window
+        for chunk_rows in (7, 100, 4096):
+            compare(source, nhours, chunk_rows)
+
+def test_stream_windows_overlapping_days(tmpdir):
+    # 24 = 4*5 + 4: the 20:00 window of each day runs to 01:00
+    check_sources(tmpdir, 5)
+
+def test_stream_windows_dividing_days(tmpdir):
+    check_sources(tmpdir, 4)
+
+def test_open_index_parses_only_new_rows(tmpdir, monkeypatch):
+    csv_path = os.path.join(str(tmpdir), 'd3s.csv')
+    write_csv(csv_path, nrows=400)
+    with open(csv_path) as f:
+        lines = f.read().splitlines(True)
+    # the index of the first rows, then rows appended to the csv
+    with open(csv_path, 'w') as f:
+        f.writelines(lines[:301])
+    spectra_windows.open_index(csv_path)
+    with open(csv_path, 'a') as f:
+        f.writelines(lines[301:])
+
+    parsed = []
+    read_spectra = spectra_io.read_spectra
+    def counting_read(source, **kwargs):
+        times, spectra, datatz = read_spectra(source, **kwargs)
+        parsed.append(len(times))
+        return times, spectra, datatz
+    monkeypatch.setattr(spectra_io, 'read_spectra', counting_read)
+    times, prefix, datatz = spectra_windows.open_index(csv_path)
+    again = spectra_windows.open_index(csv_path)
+    assert parsed == [len(lines) - 301]
+
+    expected_times, spectra, expected_tz = read_spectra(csv_path)
+    assert np.array_equal(times, expected_times)
+    assert np.array_equal(again[0], expected_times)
+    assert np.array_equal(prefix, spectra_windows.prefix_sums(spectra))
+    assert np.array_equal(again[1], prefix)
+    counts, nrows = spectra_windows.integrate(again, '2017-01-01 02:00',
+                                              '2017-01-02 02:00')
+    window = (times > times[0] + 7200) & (times < times[0] + 93600)
+    assert nrows == window.sum()
+    assert np.array_equal(counts, spectra[window].sum(axis=0))
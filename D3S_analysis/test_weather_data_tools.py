@@ -0,0 +1,94 @@
+'''
+Checks of the weather day cache against a stand-in history page server
+(the csv_server fixture of the repository conftest.py).
+
+Run with pytest from this directory or the repository root:
+    python -m pytest test_weather_data_tools.py
+'''
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import time_buckets
+import weather_data_tools as weather
+
+# two zones 25 hours apart: the date in the first is always behind
+BEHIND = 'Pacific/Pago_Pago'
+AHEAD = 'Pacific/Kiritimati'
+
+HISTORY = '''Time,TemperatureF,DewpointF,PressureIn,WindDirection,WindDirectionDegrees,WindSpeedMPH,WindSpeedGustMPH,Humidity,HourlyPrecipIn,Conditions,Clouds,dailyrainin,SolarRadiationWatts/m^2,SoftwareType,DateUTC<br>
+<br>
+2017-05-31 00:00:00,60.0,50.0,29.90,WSW,250,3.0,5.0,60,0.00,,,0.01,0,WS-1001,2017-05-31 07:00:00,
+<br>
+2017-05-31 00:05:00,61.0,50.0,29.91,WSW,250,4.0,5.0,61,0.00,,,0.01,2,WS-1001,2017-05-31 07:05:00,
+<br>
+'''.encode()
+
+def history_server(csv_server):
+    csv_server.files['WXDailyHistory.asp'] = HISTORY
+    return csv_server.url + 'WXDailyHistory.asp'
+
+def fetched_days(csv_server):
+    # day=D&month=M&year=Y of every page request
+    return sorted(tuple(int(field.split('=')[1]) for field in path.split('&')[1:4])
+                  for path, headers, status in csv_server.requests)
+
+def age(tmpdir, date, seconds):
+    path = os.path.join(str(tmpdir), 'KCABERKE7', '{:%Y-%m-%d}.npy'.format(date))
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+def test_past_day_from_cache(csv_server, tmpdir):
+    urlbase = history_server(csv_server)
+    date = datetime(2017, 5, 31)
+    first = weather.weather_data_cached('KCABERKE7', date, str(tmpdir),
+                                        urlbase=urlbase)
+    assert len(first) == 2
+    age(tmpdir, date, 10*86400)
+    again = weather.weather_data_cached('KCABERKE7', date, str(tmpdir),
+                                        urlbase=urlbase)
+    assert (again == first).all()
+    assert len(csv_server.requests) == 1
+
+def test_today_refetched_after_ttl(csv_server, tmpdir):
+    urlbase = history_server(csv_server)
+    today = datetime.now(time_buckets.get_zone(BEHIND)).replace(tzinfo=None)
+    fetch = lambda zone: weather.weather_data_cached( \
+        'KCABERKE7', today, str(tmpdir), today_ttl=600, urlbase=urlbase,
+        zone=zone)
+    fetch(BEHIND)
+    fetch(BEHIND)
+    assert len(csv_server.requests) == 1
+    age(tmpdir, today, 601)
+    # already yesterday in the station zone: kept whatever its age
+    fetch(AHEAD)
+    assert len(csv_server.requests) == 1
+    fetch(BEHIND)
+    assert len(csv_server.requests) == 2
+
+def test_range_fetches_misses_in_pool(csv_server, tmpdir, monkeypatch):
+    urlbase = history_server(csv_server)
+    zone = time_buckets.get_zone(weather.WEATHER_ZONE)
+    tstart = datetime(2017, 5, 29, tzinfo=zone)
+    tstop = datetime(2017, 6, 3, tzinfo=zone)
+    for day in (29, 31):
+        weather.weather_data_cached('KCABERKE7', datetime(2017, 5, day),
+                                    str(tmpdir), urlbase=urlbase)
+    del csv_server.requests[:]
+
+    pools = []
+    class Pool(ThreadPoolExecutor):
+        def map(self, fn, *iterables):
+            pools.append(self._max_workers)
+            return ThreadPoolExecutor.map(self, fn, *iterables)
+    monkeypatch.setattr(weather, 'ThreadPoolExecutor', Pool)
+
+    days = weather.weather_data_range('KCABERKE7', tstart, tstop,
+                                      cache_dir=str(tmpdir), max_workers=3,
+                                      urlbase=urlbase)
+    assert [day.day for day, data in days] == [29, 30, 31, 1, 2]
+    assert all(len(data) == 2 for day, data in days)
+    assert pools == [3]
+    assert fetched_days(csv_server) == [(1, 6, 2017), (2, 6, 2017),
+                                        (30, 5, 2017)]
@@ -0,0 +1,119 @@
+'''
+Calendar buckets as int64 UTC epoch edges.
+
+Bucket edges are computed once for a calendar spec: fixed hours, or local
+days, weeks or months in a time zone (a tzinfo or a zone name such as
+'America/Los_Angeles'). Local days are stepped on the wall clock, so the
+days around daylight saving changes are 23 or 25 hours long. Samples are
+then assigned to buckets with one np.searchsorted over the edges.
+'''
+import numpy as np
+from datetime import datetime
+from datetime import timedelta
+from dateutil.relativedelta import relativedelta
+from dateutil.tz import gettz
+
+try:
+    from . import time_index
+except ImportError:
+    # run from this directory rather than as the D3S_analysis package
+    import time_index
+
+UNITS = ('hour', 'day', 'week', 'month')
+
+def get_zone(zone):
+    '''
+    tzinfo for a zone name or tzinfo, UTC for None
+    '''
+    if zone is None:
+        return time_index.utc
+    if isinstance(zone, str):
+        tzinfo = gettz(zone)
+        if tzinfo is None:
+            raise ValueError('unknown time zone {}'.format(zone))
+        return tzinfo
+    return zone
+
+def _local(time, zone):
+    # wall-clock time of an aware, naive or epoch time in zone
+    if isinstance(time, (int, np.integer)):
+        time = time_index.from_epoch(time, zone)
+    elif time.tzinfo is not None:
+        time = time.astimezone(zone)
+    return time.replace(tzinfo=None)
+
+def bucket_edges(tstart, tstop, unit='hour', n=1, zone=None):
+    '''
+    Edges of consecutive buckets from tstart until tstop is covered
+
+    Arguments:
+      - start/stop as datetimes (naive taken as wall-clock time in zone)
+        or epoch seconds
+      - unit: 'hour' (fixed length), 'day', 'week' or 'month' (stepped
+        on the wall clock in zone, keeping the time of day of tstart)
+      - n: number of units in each bucket
+      - zone: tzinfo or zone name, by default the tzinfo of tstart
+
+    Returns:
+      - int64 array of UTC epoch edges, bucket i is [edges[i], edges[i+1])
+    '''
+    if unit not in UNITS:
+        raise ValueError('unit must be one of {}'.format(UNITS))
+    if zone is None and isinstance(tstart, datetime):
+        zone = tstart.tzinfo
+    zone = get_zone(zone)
+    start = _local(tstart, zone)
+    epoch_start = time_index.to_epoch(start, zone)
+    epoch_stop = time_index.to_epoch(_local(tstop, zone), zone)
+    if unit == 'hour':
+        width = int(n*3600)
+        nbuckets = max(0, -(-(epoch_stop - epoch_start)//width))
+        return epoch_start + width*np.arange(nbuckets + 1, dtype=np.int64)
+
+    step = {'day': relativedelta(days=n), 'week': relativedelta(weeks=n),
+            'month': relativedelta(months=n)}[unit]
+    edges = [epoch_start]
+    k = 0
+    while edges[-1] < epoch_stop:
+        k += 1
+        edges.append(time_index.to_epoch(start + k*step, zone))
+    return np.array(edges, dtype=np.int64)
+
+def day_windows(tstart, tstop, nhours, zone=None):
+    '''
+    nhours windows restarting at the start of every local day, the layout
+    used by get_peaks: when nhours does not divide the day the last
+    window of a day runs into the next one
+
+    Returns:
+      - int64 arrays of window start and stop in UTC epoch seconds
+    '''
+    days = bucket_edges(tstart, tstop, 'day', 1, zone)
+    width = int(nhours*3600)
+    per_day = -(-np.diff(days)//width)
+    day_of_window = np.repeat(np.arange(len(per_day)), per_day)
+    first_of_day = np.concatenate(([0], np.cumsum(per_day)[:-1]))
+    within = np.arange(len(day_of_window)) - first_of_day[day_of_window]
+    starts = days[day_of_window] + width*within
+    return starts, starts + width
+
+def assign(times, edges):
+    '''
+    Bucket of every time: i for edges[i] <= time < edges[i+1], -1 before
+    the first edge and len(edges)-1 from the last one on
+    '''
+    return np.searchsorted(edges, times, side='right') - 1
+
+def local_to_epoch(local_seconds, zone):
+    '''
+    Convert wall-clock times in zone (as seconds since 1970-01-01 on the
+    wall clock, e.g. datetime64 without a zone) into UTC epoch seconds
+      - the utc offset is looked up once per distinct hour
+    '''
+    zone = get_zone(zone)
+    local_seconds = np.asarray(local_seconds, dtype=np.int64)
+    hours, inverse = np.unique(local_seconds//3600, return_inverse=True)
+    offsets = np.array([int(zone.utcoffset(datetime(1970, 1, 1) +
+                                           timedelta(hours=int(h)))
+                            .total_seconds()) for h in hours], dtype=np.int64)
+    return local_seconds - offsets[inverse.ravel()]
@@ -0,0 +1,138 @@
+'''
+Time index for D3S and weather data.
+
+Timestamps are kept as sorted int64 UTC epoch seconds. A whole timestamp
+column is parsed in one go (numpy datetime64 for the local part, utc
+offsets parsed once per distinct suffix) and time windows become
+np.searchsorted slices instead of a parse-and-compare per row.
+'''
+import numpy as np
+from datetime import datetime
+from datetime import timedelta
+from dateutil.parser import parse
+from dateutil.tz import tzutc
+
+utc = tzutc()
+epoch_time = datetime(1970, 1, 1, tzinfo=utc)
+
+# 'YYYY-MM-DD HH:MM:SS', anything after this is fraction and/or utc offset
+LOCAL_WIDTH = 19
+
+#--------------------------------------------------------------------------#
+# Single time conversions
+#--------------------------------------------------------------------------#
+def to_epoch(time, tzinfo=None):
+    '''
+    Convert a datetime (or time string) into integer UTC epoch seconds
+      - naive times are taken to be in tzinfo (UTC if not given)
+    '''
+    if isinstance(time, str):
+        time = parse(time)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=tzinfo or utc)
+    return int((time - epoch_time).total_seconds())
+
+def from_epoch(seconds, tzinfo=None):
+    '''
+    Convert UTC epoch seconds back into an aware datetime in tzinfo
+    '''
+    time = epoch_time + timedelta(seconds=int(seconds))
+    return time.astimezone(tzinfo or utc)
+
+#--------------------------------------------------------------------------#
+# Bulk parsing
+#--------------------------------------------------------------------------#
+def parse_times(strings):
+    '''
+    Parse a whole column of timestamps at once
+
+    Arguments:
+      - sequence of time strings ('YYYY-MM-DD HH:MM:SS' with optional
+        fraction and utc offset) or of unix timestamps (seconds or ms)
+
+    Returns:
+      - int64 array of UTC epoch seconds
+      - tzinfo of the last timestamp
+    '''
+    strings = np.asarray(strings, dtype=str)
+    if len(strings) == 0:
+        return np.zeros(0, dtype=np.int64), utc
+    try:
+        values = strings.astype(float)
+    except ValueError:
+        pass
+    else:
+        if values.max() > 1e11:
+            values = values/1000.0
+        return values.astype(np.int64), utc
+
+    try:
+        return _parse_iso_times(strings)
+    except ValueError:
+        # mixed or unusual formats: fall back on dateutil for every entry
+        parsed = [parse(s) for s in strings]
+        times = np.array([to_epoch(t) for t in parsed], dtype=np.int64)
+        return times, parsed[-1].tzinfo or utc
+
+def _parse_iso_times(strings):
+    width = strings.dtype.itemsize//4
+    if width < LOCAL_WIDTH:
+        raise ValueError('time strings too short')
+    # split each fixed width string into its local part and its suffix
+    chars = strings.view(np.uint32).reshape(len(strings), width)
+    local = np.ascontiguousarray(chars[:, :LOCAL_WIDTH]).view(
+        'U{}'.format(LOCAL_WIDTH)).ravel()
+    local = local.astype('datetime64[s]').astype(np.int64)
+    if width == LOCAL_WIDTH:
+        return local, utc
+
+    suffix = np.ascontiguousarray(chars[:, LOCAL_WIDTH:]).view(
+        'U{}'.format(width - LOCAL_WIDTH)).ravel()
+    suffixes, inverse = np.unique(suffix, return_inverse=True)
+    offsets = np.zeros(len(suffixes), dtype=np.int64)
+    tzinfos = []
+    for i, s in enumerate(suffixes):
+        tzinfo = parse('2000-01-01 00:00:00' + s).tzinfo
+        if tzinfo is not None:
+            offsets[i] = int(tzinfo.utcoffset(None).total_seconds())
+        tzinfos.append(tzinfo or utc)
+    inverse = inverse.ravel()
+    return local - offsets[inverse], tzinfos[inverse[-1]]
+
+#--------------------------------------------------------------------------#
+# Window selection
+#--------------------------------------------------------------------------#
+def sort_index(times):
+    '''
+    Indices that put times in chronological order, None if already sorted
+    '''
+    if len(times) < 2 or np.all(times[1:] >= times[:-1]):
+        return None
+    return np.argsort(times, kind='stable')
+
+def window_slice(times, tstart, tstop):
+    '''
+    Slice of the sorted times strictly between tstart and tstop
+
+    Arguments:
+      - sorted array of UTC epoch seconds
+      - start/stop as datetimes (naive taken as UTC) or epoch seconds
+    '''
+    if not isinstance(tstart, (int, np.integer)):
+        tstart = to_epoch(tstart)
+    if not isinstance(tstop, (int, np.integer)):
+        tstop = to_epoch(tstop)
+    first = np.searchsorted(times, tstart, side='right')
+    last = np.searchsorted(times, tstop, side='left')
+    return slice(int(first), int(max(first, last)))
+
+def window_rows(times, starts, stops):
+    '''
+    Rows of the sorted times strictly inside each window, as in window_slice
+
+    Returns:
+      - index of the first row and of the row past the end of each window
+    '''
+    first = np.searchsorted(times, starts, side='right')
+    last = np.searchsorted(times, stops, side='left')
+    return first, np.maximum(first, last)
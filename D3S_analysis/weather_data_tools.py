@@ -1,72 +1,149 @@
-import csv
-import io
-
-# Python 2 and 3: easiest option
-from future.standard_library import install_aliases
-install_aliases()
-
-from urllib.parse import urlparse, urlencode
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError
-
-import numpy as np
-import os
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from datetime import datetime
-from datetime import timedelta
-from matplotlib.dates import date2num
-
-def weather_station_data_scrape(ID, date):
-    '''
-    Scrap weather data of given location and given period of time from websites
-
-    Arguments:
-        - ID is a string contains weather station ID
-    	- date is a 1 by 3 string array: Month/Date/Year
-    '''
-
-    data_temp=[]
-    str1 = 'https://www.wunderground.com/weatherstation/WXDailyHistory.asp?ID='
-    str2 = '&day='
-    str3 = '&month='
-    str4 = '&year='
-    str5 = '&graphspan=day&format=1'
-    url = str1+ID+str2+str(date.day)+str3+str(date.month)\
-          +str4+str(date.year)+str5
-    response = urlopen(url)
-    #cr = csv.reader(response)
-    cr=csv.reader(io.TextIOWrapper(response))
-    for row in cr:
-        if len(row)<= 1: continue
-        data_temp.append(row)
-
-    #Stores data with correct data type (datetime/string/double)
-    data = [[0 for i in range(len(data_temp[1][:])-3)] for j in range(len(data_temp))]
-
-    for i in range(len(data_temp)):
-        if i == 0:
-            data[0][:]=data_temp[0][0:len(data_temp[i][:])-2]
-        elif i > 0:
-            data[i][0]=datetime.strptime(data_temp[i][0], '%Y-%m-%d %H:%M:%S')
-            data[i][1:data_temp[0][:].index('WindDirection')]=tuple(float(list_item) for list_item in data_temp[i][1:data_temp[0][:].index('WindDirection')])
-            data[i][data_temp[0][:].index('WindDirection')] = data_temp[i][data_temp[0][:].index('WindDirection')]
-            data[i][data_temp[0][:].index('WindDirection')+1:data_temp[0][:].index('Conditions')] = tuple(float(list_item) for list_item in data_temp[i][data_temp[0][:].index('WindDirection')+1:data_temp[0][:].index('Conditions')])
-            data[i][data_temp[0][:].index('Conditions'):data_temp[0][:].index('Clouds')+1] = data_temp[i][data_temp[0][:].index('Conditions'):data_temp[0][:].index('Clouds')+1]
-            data[i][data_temp[0][:].index('Clouds')+1:len(data_temp[0][:])-2] = tuple(float(list_item) for list_item in data_temp[i][data_temp[0][:].index('Clouds')+1:len(data_temp[i][:])-3])
-
-    #Select data for output array:
-    #   (Date,Temperature, Pressure, Windspeed, Humidity,
-    #    Hourly Precipitation, and Solar radiation)
-    data_out = [[0 for i in range(7)] for j in range(len(data))]
-
-    for i in range(len(data_temp)):
-        data_out[i][0:2] = data[i][0:2]
-        data_out[i][2] = data[i][3]
-        data_out[i][3] = data[i][6]
-        data_out[i][4:6] = data[i][8:10]
-        data_out[i][6] = data[i][12]
-
-    # remove meta data
-    data_out.pop(0)
-    return data_out
+import csv
+import io
+
+# Python 2 and 3: easiest option
+from future.standard_library import install_aliases
+install_aliases()
+
+from urllib.parse import urlparse, urlencode
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+
+import numpy as np
+import os
+import time
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from matplotlib.dates import date2num
+
+import time_buckets
+import time_index
+
+WUNDERGROUND_URL = 'https://www.wunderground.com/weatherstation/WXDailyHistory.asp'
+# time zone of the wall-clock times on the daily history pages of the
+#   (Berkeley) stations used here
+WEATHER_ZONE = 'America/Los_Angeles'
+
+# Output fields of weather_station_data_scrape and the (start of the) name of
+#   the daily history column each one is read from
+WEATHER_COLUMNS = [('time', 'Time'),
+                   ('temperature', 'TemperatureF'),
+                   ('pressure', 'PressureIn'),
+                   ('windspeed', 'WindSpeedMPH'),
+                   ('humidity', 'Humidity'),
+                   ('precip_hourly', 'HourlyPrecipIn'),
+                   ('solar_radiation', 'SolarRadiation')]
+WEATHER_DTYPE = np.dtype([('time', 'datetime64[s]')] + \
+                         [(name, float) for name, col in WEATHER_COLUMNS[1:]])
+
+def weather_station_data_scrape(ID, date, urlbase=WUNDERGROUND_URL):
+    '''
+    Scrap weather data of given location and given period of time from websites
+
+    Arguments:
+        - ID is a string contains weather station ID
+    	- date is a 1 by 3 string array: Month/Date/Year
+        - urlbase of the daily history page
+
+    Returns:
+        - structured array with fields time (local, datetime64), temperature,
+          pressure, windspeed, humidity, precip_hourly and solar_radiation
+    '''
+
+    str1 = urlbase+'?ID='
+    str2 = '&day='
+    str3 = '&month='
+    str4 = '&year='
+    str5 = '&graphspan=day&format=1'
+    url = str1+ID+str2+str(date.day)+str3+str(date.month)\
+          +str4+str(date.year)+str5
+    response = urlopen(url)
+    cr=csv.reader(io.TextIOWrapper(response))
+    rows = [row for row in cr if len(row) > 1]
+    return parse_daily_history(rows)
+
+def parse_daily_history(rows):
+    '''
+    Convert the csv rows of a daily history page (header first) into a
+    structured array, one column at a time (see weather_station_data_scrape)
+    '''
+    data = np.zeros(max(len(rows)-1, 0), dtype=WEATHER_DTYPE)
+    if len(data) == 0:
+        return data
+
+    header = rows[0]
+    # column positions are resolved once; rows can be ragged at the end
+    width = min(len(row) for row in rows[1:])
+    columns = list(zip(*[row[:width] for row in rows[1:]]))
+    for name, col in WEATHER_COLUMNS:
+        index = [i for i, h in enumerate(header) if h.startswith(col)][0]
+        values = np.array(columns[index])
+        if name == 'time':
+            data[name] = values.astype('datetime64[s]')
+        else:
+            data[name] = np.where(values == '', 'nan', values).astype(float)
+    return data
+
+def weather_data_cached(ID, date, cache_dir, today_ttl=3600,
+                        urlbase=WUNDERGROUND_URL, zone=WEATHER_ZONE):
+    '''
+    Daily weather data for one station, read from an on-disk cache if possible
+
+    Arguments:
+        - ID is a string contains weather station ID
+        - date (datetime or date) of the day to get
+        - cache_dir holding one .npy file per (station ID, date)
+        - today_ttl: seconds before a cached copy of today (or a later day)
+          is fetched again; past days never expire
+        - zone: time zone (tzinfo or name) of the station, whose date
+          decides which day is today
+    '''
+    path = os.path.join(cache_dir, ID, '{:%Y-%m-%d}.npy'.format(date))
+    if os.path.exists(path):
+        age = time.time() - os.path.getmtime(path)
+        day = date.date() if isinstance(date, datetime) else date
+        today = datetime.now(time_buckets.get_zone(zone)).date()
+        if day < today or age < today_ttl:
+            return np.load(path)
+
+    data = weather_station_data_scrape(ID, date, urlbase)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    # write then rename so concurrent readers never see a partial file
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, data)
+    os.rename(tmp_path, path)
+    return data
+
+def weather_data_range(ID, tstart, tstop, cache_dir=None, max_workers=4,
+                       today_ttl=3600, urlbase=WUNDERGROUND_URL, zone=None):
+    '''
+    Daily weather data for every day from tstart up to tstop
+
+    Days missing from the cache are fetched concurrently by up to
+    max_workers threads.
+
+    Arguments:
+        - zone: time zone (tzinfo or name) of the station days, by default
+          that of tstart
+
+    Returns:
+        - list of (day start, data) pairs, day start stepping one local
+          day at a time from tstart (see time_buckets.bucket_edges)
+    '''
+    zone = time_buckets.get_zone(zone or tstart.tzinfo)
+    edges = time_buckets.bucket_edges(tstart, tstop, 'day', zone=zone)
+    days = [time_index.from_epoch(edge, zone) for edge in edges[:-1]]
+
+    if cache_dir is None:
+        fetch = lambda date: weather_station_data_scrape(ID, date, urlbase)
+    else:
+        fetch = lambda date: weather_data_cached(ID, date, cache_dir,
+                                                 today_ttl, urlbase, zone)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        data = list(pool.map(fetch, days))
+    return list(zip(days, data))
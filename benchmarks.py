@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+# Timing checks for tools.py. Run with:
+#     python benchmarks.py
+
+from __future__ import print_function
+import csv
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from datetime import datetime
+from datetime import timedelta
+
+import tools
+
+header = ('receiveTime,receiveTime_local,receiveTime_unix,deviceID,'
+          'stationID,counts,cpm,cpmError,error_flag')
+
+
+def make_dosenet_lines(nrows, step=300):
+    """
+    Make nrows of CSV lines shaped like a DoseNet station file.
+    """
+
+    start = datetime(2015, 1, 1)
+    lines = [header]
+    for i in range(nrows):
+        t = start + timedelta(seconds=step * i)
+        cpm = 5 + (i % 7) * 0.2
+        lines.append('{:%Y-%m-%d %H:%M:%S},{:%Y-%m-%d %H:%M:%S},{},1,1,{},{},{},0'
+                     .format(t, t, (t - tools.epoch_time).total_seconds(),
+                             int(cpm * 5), cpm, np.sqrt(cpm / 5.)))
+    return lines
+
+
+def parse_with_append(lines):
+    """
+    The previous parse_csv_object: np.append once per row.
+    """
+
+    reader = csv.DictReader(lines)
+    time_format = '%Y-%m-%d %H:%M:%S'
+    ts = np.array([], dtype=float)
+    cpm = np.array([], dtype=float)
+    cpm_err = np.array([], dtype=float)
+    for row in reader:
+        this_datetime = datetime.strptime(row['receiveTime'], time_format)
+        ts = np.append(ts, (this_datetime - tools.epoch_time).total_seconds())
+        cpm = np.append(cpm, float(row['cpm']))
+        cpm_err = np.append(cpm_err, float(row['cpmError']))
+    return ts, cpm, cpm_err
+
+
+def benchmark_parse_csv_object(sizes=(10000, 100000, 1000000)):
+    """
+    Time parse_csv_object at each size; linear scaling keeps us/row flat.
+    """
+
+    print('parse_csv_object:')
+    for nrows in sizes:
+        lines = make_dosenet_lines(nrows)
+        t0 = time.time()
+        ts, cpm, cpm_err = tools.parse_csv_object(lines)
+        dt = time.time() - t0
+        assert len(ts) == nrows
+        print('  {:>8} rows: {:7.3f} s ({:.2f} us/row)'.format(
+            nrows, dt, 1e6 * dt / nrows))
+
+    nrows = sizes[0]
+    lines = make_dosenet_lines(nrows)
+    t0 = time.time()
+    old = parse_with_append(lines)
+    dt = time.time() - t0
+    new = tools.parse_csv_object(lines)
+    assert all(np.array_equal(a, b) for a, b in zip(old, new))
+    print('  np.append version, {} rows: {:.3f} s'.format(nrows, dt))
+
+
+def benchmark_compressed_csv(nrows=500000):
+    """
+    Time parse_csv_file on the same station file stored plain and
+    compressed with each codec in spectra_io.COMPRESSED_FORMATS.
+    """
+
+    tmpdir = tempfile.mkdtemp()
+    plain = os.path.join(tmpdir, 'station.csv')
+    with open(plain, 'w') as f:
+        f.write('\n'.join(make_dosenet_lines(nrows)) + '\n')
+    size = os.path.getsize(plain)
+
+    print('parse_csv_file, {} rows ({:.1f} MB):'.format(nrows, size / 1e6))
+    paths = [('none', plain)]
+    for prefix, codec in tools.spectra_io.COMPRESSED_FORMATS:
+        name = codec.__name__
+        path = plain + '.' + name
+        with open(plain, 'rb') as f_in, codec.open(path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        paths.append((name, path))
+
+    for name, path in paths:
+        t0 = time.time()
+        ts, cpm, cpm_err = tools.parse_csv_file(path)
+        dt = time.time() - t0
+        assert len(ts) == nrows
+        print('  {:>5}: {:7.3f} s, {:6.1f} MB/s, ratio {:5.1f}'.format(
+            name, dt, size / 1e6 / dt, size / float(os.path.getsize(path))))
+    shutil.rmtree(tmpdir)
+
+
+def month_bin_loop(ts, cpm, cpm_err):
+    """
+    Monthly means the way Lesson Module 6 month_bin computes them, with
+    one Python step per row. The errors are added in quadrature, as
+    tools.resample does, so the two give the same result.
+    """
+
+    months = []
+    sums = []
+    err2 = []
+    nrows = []
+    for t, c, e in zip(ts, cpm, cpm_err):
+        date = tools.epoch_time + timedelta(seconds=t)
+        month = (date.year, date.month)
+        if not months or months[-1] != month:
+            months.append(month)
+            sums.append(0.)
+            err2.append(0.)
+            nrows.append(0)
+        sums[-1] += c
+        err2[-1] += e**2
+        nrows[-1] += 1
+    nrows = np.array(nrows)
+    return np.array(sums) / nrows, np.sqrt(err2) / nrows, nrows
+
+
+def benchmark_resample(nstations=50, years=10):
+    """
+    Time tools.resample on one station for each freq, and
+    tools.resample_stations on nstations stations of years of data.
+    """
+
+    nrows = int(years * 365.25 * 86400 / tools.cpm_interval)
+    rng = np.random.RandomState(0)
+    start = (datetime(2015, 1, 1) - tools.epoch_time).total_seconds()
+    ts = start + tools.cpm_interval * np.arange(nrows, dtype=float)
+    cpm = rng.normal(5., 0.5, nrows)
+    cpm_err = np.sqrt(cpm / 5.)
+
+    print('resample, {} rows:'.format(nrows))
+    for freq in tools.resample_freqs:
+        t0 = time.time()
+        starts, mean, err, counts = tools.resample(ts, cpm, cpm_err, freq)
+        dt = time.time() - t0
+        assert counts.sum() == nrows
+        print('  {:>5}: {:6.3f} s, {} bins'.format(freq, dt, len(starts)))
+
+    n = nrows // 10
+    t0 = time.time()
+    loop_mean, loop_err, loop_nrows = month_bin_loop(ts[:n], cpm[:n],
+                                                     cpm_err[:n])
+    dt = time.time() - t0
+    starts, mean, err, counts = tools.resample(ts[:n], cpm[:n], cpm_err[:n],
+                                               'month')
+    assert np.array_equal(counts, loop_nrows)
+    assert np.allclose(mean, loop_mean) and np.allclose(err, loop_err)
+    print('  per-row loop, month, {} rows: {:.3f} s'.format(n, dt))
+
+    ts_list = [ts + 60 * i for i in range(nstations)]
+    cpm_list = [cpm] * nstations
+    err_list = [cpm_err] * nstations
+    for freq in ('hour', 'month'):
+        t0 = time.time()
+        starts, mean, err, counts = tools.resample_stations(
+            ts_list, cpm_list, err_list, freq)
+        dt = time.time() - t0
+        assert counts.shape == (nstations, len(starts))
+        print('  {} stations, {}: {:.3f} s'.format(nstations, freq, dt))
+
+
+if __name__ == '__main__':
+    benchmark_parse_csv_object()
+    benchmark_compressed_csv()
+    benchmark_resample()
@@ -0,0 +1,86 @@
+'''
+Fixtures shared by the tests of tools.py and D3S_analysis.
+'''
+import hashlib
+import threading
+import pytest
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+    ThreadingHTTPServer = None
+
+
+class CsvServer(object):
+    '''
+    Stand-in for the radwatch (or weather history) server on localhost
+
+    Serves the bytes in files (name -> bytes, whatever the query) with an
+    ETag, answers If-None-Match with 304 and 'Range: bytes=N-' with 206
+    or 416.
+    Every request is logged in requests as (path, headers, status).
+    '''
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                name = self.path.lstrip('/').split('?')[0]
+                self.serve(server.files.get(name))
+
+            def serve(self, data):
+                headers = dict(self.headers)
+                if data is None:
+                    return self.reply(404, headers)
+                etag = '"{}"'.format(hashlib.md5(data).hexdigest())
+                if self.headers.get('If-None-Match') == etag:
+                    return self.reply(304, headers)
+                start = 0
+                status = 200
+                extra = {'ETag': etag}
+                if self.headers.get('Range'):
+                    start = int(self.headers['Range'].split('=')[1].split('-')[0])
+                    if start >= len(data):
+                        extra = {'Content-Range': 'bytes */{}'.format(len(data))}
+                        return self.reply(416, headers, extra)
+                    status = 206
+                    extra['Content-Range'] = 'bytes {}-{}/{}'.format(
+                        start, len(data) - 1, len(data))
+                self.reply(status, headers, extra, data[start:])
+
+            def reply(self, status, headers, extra=None, body=b''):
+                server.requests.append((self.path, headers, status))
+                self.send_response(status)
+                for key, value in (extra or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}/'.format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def statuses(self):
+        return [status for path, headers, status in self.requests]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def csv_server():
+    if ThreadingHTTPServer is None:
+        pytest.skip('needs http.server from Python 3.7')
+    server = CsvServer()
+    yield server
+    server.close()
@@ -0,0 +1,37 @@
+'''
+Checks of the DoseNet csv tools against a stand-in http server
+(the csv_server fixture in conftest.py).
+
+Run with pytest from the repository root:
+    python -m pytest test_tools.py
+'''
+import numpy as np
+
+import tools
+
+
+def station_csv(first, last, header=True):
+    # DoseNet rows every 5 minutes from 2015-01-01
+    lines = 'receiveTime,receiveTime_local,receiveTime_unix,deviceID,' \
+        'stationID,counts,cpm,cpmError,error_flag\n' if header else ''
+    rows = ['{0},{0},{1}.0,1,1,{2},{3},1.0,0\n'.format(
+        (tools.epoch_time + tools.timedelta(seconds=1420070400 + 300*i))
+        .strftime('%Y-%m-%d %H:%M:%S'), 1420070400 + 300*i, 25 + i % 7,
+        5.0 + (i % 7)/5.0) for i in range(first, last)]
+    return (lines + ''.join(rows)).encode()
+
+
+def test_cached_station_fetches_only_new_rows(csv_server, tmpdir):
+    csv_server.files['lbl.csv'] = station_csv(0, 200)
+    ts, cpm, cpm_err = tools.get_dosenet_csv_data(
+        'lbl', cache_dir=str(tmpdir), urlbase=csv_server.url)
+    assert len(ts) == 200
+    csv_server.files['lbl.csv'] += station_csv(200, 210, header=False)
+    ts, cpm, cpm_err = tools.get_dosenet_csv_data(
+        'lbl', cache_dir=str(tmpdir), urlbase=csv_server.url)
+    assert len(ts) == 210
+    assert np.all(np.diff(ts) == 300)
+    ts, cpm, cpm_err = tools.get_dosenet_csv_data(
+        'lbl', cache_dir=str(tmpdir), urlbase=csv_server.url)
+    assert len(ts) == 210
+    assert csv_server.statuses() == [200, 206, 304]
@@ -1,103 +1,345 @@
-# -*- coding: utf-8 -*-
-
-# Brian Plimley, 2016-09-08
-# Tools for analyzing and plotting DoseNet data.
-
-from __future__ import print_function
-import requests
-import csv
-import numpy as np
-from datetime import datetime
-from datetime import timedelta
-import matplotlib.pyplot as plt
-
-epoch_time = datetime(1970, 1, 1)
-
-
-def get_dosenet_csv_data(nickname):
-    """
-    Get a CSV file from the RadWatch website.
-
-    Input: nickname of DoseNet station.
-    """
-
-    if nickname[-4:] == '.csv':
-        nickname = nickname[:-4]
-    urlbase = 'https://radwatch.berkeley.edu/sites/default/files/dosenet/'
-    url = urlbase + '{}.csv'.format(nickname)
-
-    req = requests.get(url)
-    assert req.ok, 'Bad request. Is the nickname a public station?'
-    f = req.iter_lines()
-
-    ts, cpm, cpm_err = parse_csv_object(f)
-
-    return ts, cpm, cpm_err
-
-
-def parse_csv_object(filelike_object):
-
-    # TODO: do this all with pandas in like 1 line
-    reader = csv.DictReader(filelike_object)
-
-    time_format = '%Y-%m-%d %H:%M:%S'
-
-    ts = np.array([], dtype=float)
-    cpm = np.array([], dtype=float)
-    cpm_err = np.array([], dtype=float)
-
-    for row in reader:
-        this_datetime = datetime.strptime(row['receiveTime'], time_format)
-        ts = np.append(ts, (this_datetime - epoch_time).total_seconds())
-        cpm = np.append(cpm, float(row['cpm']))
-        cpm_err = np.append(cpm_err, float(row['cpmError']))
-
-    return ts, cpm, cpm_err
-
-
-def parse_csv_file(filepath):
-    """
-    Take a local CSV file and parse into timestamp, cpm, cpm_error.
-    """
-
-    with open(filepath) as f:
-        ts, cpm, cpm_err = parse_csv_object(f)
-
-    return ts, cpm, cpm_err
-
-
-def plot(ts, cpm, cpm_err, **kwargs):
-    """
-    Plot the data from a station, nicely.
-    """
-
-    datetimes = np.array([epoch_time + timedelta(seconds=s) for s in ts])
-
-    plt.figure()
-    plt.errorbar(datetimes, cpm, yerr=cpm_err, fmt='.b', **kwargs)
-
-
-def check_data_reliability(ts):
-    """
-    Go through timestamp vector and check intervals.
-    """
-
-    dt = ts[1:] - ts[:-1]
-
-    min_interval = 290
-    max_interval = 310
-
-    too_short = np.nonzero(dt < min_interval)[0]
-    too_long = np.nonzero(dt > max_interval)[0]
-
-    # import ipdb; ipdb.set_trace()
-    for i in too_short:
-        print('Too short: {} to {} ({} s)'.format(
-            epoch_time + timedelta(seconds=ts[i]),
-            epoch_time + timedelta(seconds=ts[i+1]),
-            dt[i]))
-    for i in too_long:
-        print('Too long: {} to {} ({} s)'.format(
-            epoch_time + timedelta(seconds=ts[i]),
-            epoch_time + timedelta(seconds=ts[i+1]),
-            dt[i]))
+# -*- coding: utf-8 -*-
+
+# Brian Plimley, 2016-09-08
+# Tools for analyzing and plotting DoseNet data.
+
+from __future__ import print_function
+import requests
+import csv
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from dateutil.tz import tzoffset
+import matplotlib.pyplot as plt
+
+# csv mirroring, decompression, gap tables and calendar bins are shared
+# with the D3S analysis
+from D3S_analysis import reliability
+from D3S_analysis import spectra_io
+from D3S_analysis import time_buckets
+from D3S_analysis import time_index
+
+epoch_time = datetime(1970, 1, 1)
+dosenet_urlbase = 'https://radwatch.berkeley.edu/sites/default/files/dosenet/'
+
+# nominal spacing of DoseNet rows (s)
+cpm_interval = 300
+
+# bin widths understood by resample; weeks start on Monday
+resample_freqs = time_buckets.UNITS
+
+
+def get_dosenet_csv_data(nickname, cache_dir=None, urlbase=dosenet_urlbase,
+                         session=None):
+    """
+    Get a CSV file from the RadWatch website.
+
+    Input: nickname of DoseNet station.
+    If cache_dir is given, a local copy is kept there and only the rows
+    added since the last call are downloaded (see spectra_io.mirror_csv).
+    The response is parsed while it streams in; pass a requests.Session
+    to reuse its connections.
+    """
+
+    if nickname[-4:] == '.csv':
+        nickname = nickname[:-4]
+    url = urlbase + '{}.csv'.format(nickname)
+
+    if cache_dir is not None:
+        local_path = os.path.join(cache_dir, '{}.csv'.format(nickname))
+        spectra_io.mirror_csv(url, local_path, time_col=0, session=session)
+        return parse_csv_file(local_path)
+
+    req = (session or requests).get(url, stream=True)
+    assert req.ok, 'Bad request. Is the nickname a public station?'
+    f = req.iter_lines(chunk_size=65536)
+
+    ts, cpm, cpm_err = parse_csv_object(f)
+
+    return ts, cpm, cpm_err
+
+
+def get_dosenet_csv_data_bulk(nicknames, max_workers=8, cache_dir=None,
+                              urlbase=dosenet_urlbase):
+    """
+    Get CSV data for many DoseNet stations concurrently.
+
+    Stations are fetched by max_workers threads sharing one keep-alive
+    connection pool of the same size, and each is parsed as it arrives.
+
+    Returns:
+      data: dict of nickname -> (ts, cpm, cpm_err), for stations that worked
+      report: dict of nickname -> {'seconds': wall time, 'error': message
+              or None}
+    """
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=max_workers,
+                                            pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def fetch(nickname):
+        t0 = time.time()
+        try:
+            result = get_dosenet_csv_data(nickname, cache_dir=cache_dir,
+                                          urlbase=urlbase, session=session)
+            error = None
+        except Exception as e:
+            result = None
+            error = '{}: {}'.format(type(e).__name__, e)
+        return result, {'seconds': time.time() - t0, 'error': error}
+
+    data = {}
+    report = {}
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for nickname, (result, info) in zip(nicknames,
+                                            pool.map(fetch, nicknames)):
+            report[nickname] = info
+            if result is not None:
+                data[nickname] = result
+            else:
+                print('Failed to get {}: {}'.format(nickname, info['error']))
+
+    return data, report
+
+
+def parse_csv_object(filelike_object, chunk_rows=65536):
+    """
+    Parse lines of a DoseNet CSV into timestamp, cpm, cpm_error arrays.
+
+    Columns are found from the header. Rows are collected a chunk at a
+    time and each chunk is converted in bulk, so the run time is linear
+    in the number of rows and the memory stays within a small multiple
+    of the returned arrays.
+    """
+
+    lines = (line.decode('utf-8') if isinstance(line, bytes) else line
+             for line in filelike_object)
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return (np.array([], dtype=float), np.array([], dtype=float),
+                np.array([], dtype=float))
+    i_time = header.index('receiveTime')
+    i_cpm = header.index('cpm')
+    i_err = header.index('cpmError')
+
+    ts_chunks = []
+    cpm_chunks = []
+    err_chunks = []
+    time_col = []
+    cpm_col = []
+    err_col = []
+    for row in reader:
+        if not row:
+            continue
+        time_col.append(row[i_time])
+        cpm_col.append(row[i_cpm])
+        err_col.append(row[i_err])
+        if len(time_col) == chunk_rows:
+            ts_chunks.append(_parse_times(time_col))
+            cpm_chunks.append(np.array(cpm_col, dtype=float))
+            err_chunks.append(np.array(err_col, dtype=float))
+            time_col = []
+            cpm_col = []
+            err_col = []
+    ts_chunks.append(_parse_times(time_col))
+    cpm_chunks.append(np.array(cpm_col, dtype=float))
+    err_chunks.append(np.array(err_col, dtype=float))
+
+    ts = np.concatenate(ts_chunks)
+    cpm = np.concatenate(cpm_chunks)
+    cpm_err = np.concatenate(err_chunks)
+
+    return ts, cpm, cpm_err
+
+
+def _parse_times(time_strings):
+    """
+    Convert a list of receiveTime strings into seconds since epoch_time.
+    """
+
+    try:
+        times = np.array(time_strings, dtype='datetime64[s]')
+        return times.astype(np.int64).astype(float)
+    except ValueError:
+        time_format = '%Y-%m-%d %H:%M:%S'
+        return np.array(
+            [(datetime.strptime(t, time_format) - epoch_time).total_seconds()
+             for t in time_strings], dtype=float)
+
+
+def open_csv_file(filepath):
+    """
+    Open a local CSV file as text. Files compressed with gzip, bz2 or xz
+    are recognized by their first bytes and decompressed as they are read.
+    """
+
+    codec = spectra_io.compression(filepath)
+    if codec is not None:
+        return codec.open(filepath, 'rt')
+    return open(filepath)
+
+
+def parse_csv_file(filepath):
+    """
+    Take a local CSV file (optionally gzip, bz2 or xz compressed) and parse
+    into timestamp, cpm, cpm_error.
+    """
+
+    with open_csv_file(filepath) as f:
+        ts, cpm, cpm_err = parse_csv_object(f)
+
+    return ts, cpm, cpm_err
+
+
+def plot(ts, cpm, cpm_err, **kwargs):
+    """
+    Plot the data from a station, nicely.
+    """
+
+    datetimes = np.array([epoch_time + timedelta(seconds=s) for s in ts])
+
+    plt.figure()
+    plt.errorbar(datetimes, cpm, yerr=cpm_err, fmt='.b', **kwargs)
+
+
+def check_data_reliability(ts, min_interval=290, max_interval=310,
+                           verbose=True):
+    """
+    Go through timestamp vector and check intervals.
+
+    Returns a structured array of the intervals shorter than min_interval
+    or longer than max_interval, with fields start, stop, seconds,
+    missing_rows (5 minute rows missing in a long interval) and kind
+    ('short' or 'long'), in whole seconds as reliability.gap_table gives
+    for D3S data. With verbose, each one is also printed.
+    """
+
+    gaps = reliability.gap_table(ts, min_interval, max_interval, cpm_interval)
+    if verbose:
+        reliability.print_gaps(gaps)
+    return gaps
+
+
+def window_coverage(ts, starts, stops, interval=None):
+    """
+    Live time and coverage of time windows of CPM data.
+
+    Input: sorted timestamps, and window start/stop times (epoch seconds).
+    Each row counts for interval seconds (cpm_interval by default).
+    Returns the number of rows in each window [start, stop), their live
+    time, and the fraction of each window covered by data (at most 1).
+    """
+
+    if interval is None:
+        interval = cpm_interval
+    starts = np.asarray(starts)
+    stops = np.asarray(stops)
+    nrows = (np.searchsorted(ts, stops, side='left') -
+             np.searchsorted(ts, starts, side='left'))
+    live_time = nrows * float(interval)
+    coverage = np.minimum(live_time / np.maximum(stops - starts, 1), 1.0)
+    return nrows, live_time, coverage
+
+
+def bin_starts(ts, freq='day', offset=0, zone=None):
+    """
+    Start of the hour, day, week or month bin holding each timestamp.
+
+    Input: timestamps (seconds since epoch_time, as from parse_csv_object)
+    and freq, one of resample_freqs. Calendar bins follow the clock
+    offset seconds ahead of the timestamps, e.g. -7 * 3600 for PDT, or
+    the wall clock of zone (a tzinfo or a name such as
+    'America/Los_Angeles'), whose days are 23 or 25 hours long around
+    daylight saving changes. The bin edges are time_buckets.bucket_edges
+    from the bin holding the first timestamp.
+    Returns the bin starts in the same seconds as ts.
+    """
+
+    if freq not in resample_freqs:
+        raise ValueError('freq must be one of {}'.format(resample_freqs))
+    seconds = np.floor(np.asarray(ts, dtype=float)).astype(np.int64)
+    if len(seconds) == 0:
+        return np.zeros(0)
+    if zone is None:
+        zone = tzoffset(None, offset)
+    zone = time_buckets.get_zone(zone)
+
+    # wall-clock start of the bin holding the first timestamp
+    first = time_index.from_epoch(seconds.min(), zone).replace(tzinfo=None)
+    first = first.replace(minute=0, second=0, microsecond=0)
+    if freq != 'hour':
+        first = first.replace(hour=0)
+    if freq == 'week':
+        first -= timedelta(days=first.weekday())
+    elif freq == 'month':
+        first = first.replace(day=1)
+
+    edges = time_buckets.bucket_edges(first, int(seconds.max()) + 1, freq,
+                                      zone=zone)
+    return edges[time_buckets.assign(seconds, edges)].astype(float)
+
+
+def resample(ts, cpm, cpm_err, freq='day', offset=0, zone=None):
+    """
+    Average CPM data into hour, day, week or month bins.
+
+    Input: ts, cpm, cpm_err arrays from parse_csv_object, and the bins as
+    in bin_starts. Each bin gets the mean of its rows; the errors of the
+    rows are added in quadrature, so the error of the mean is
+    sqrt(sum(cpm_err**2)) / n.
+    Returns bin starts, mean cpm, error of the mean and number of rows,
+    for the bins holding data, in time order.
+    """
+
+    ts = np.asarray(ts, dtype=float)
+    cpm = np.asarray(cpm, dtype=float)
+    cpm_err = np.asarray(cpm_err, dtype=float)
+    starts = bin_starts(ts, freq, offset, zone)
+    if np.any(starts[1:] < starts[:-1]):
+        order = np.argsort(starts, kind='stable')
+        starts, cpm, cpm_err = starts[order], cpm[order], cpm_err[order]
+
+    starts, first, nrows = np.unique(starts, return_index=True,
+                                     return_counts=True)
+    if len(starts) == 0:
+        return starts, np.zeros(0), np.zeros(0), np.zeros(0, dtype=int)
+    mean = np.add.reduceat(cpm, first) / nrows
+    err = np.sqrt(np.add.reduceat(cpm_err**2, first)) / nrows
+    return starts, mean, err, nrows
+
+
+def resample_stations(ts_list, cpm_list, err_list, freq='day', offset=0,
+                      zone=None):
+    """
+    Resample several stations onto one common set of bins.
+
+    Input: one ts, cpm and cpm_err array per station (stations may have
+    different lengths and time spans), and the bins as in resample.
+    Returns the bin starts of every bin holding data at any station, and
+    stations x bins arrays of mean cpm, error and number of rows; bins
+    without data at a station are NaN with 0 rows.
+    """
+
+    per_station = [resample(ts, cpm, cpm_err, freq, offset, zone)
+                   for ts, cpm, cpm_err in zip(ts_list, cpm_list, err_list)]
+    starts = np.unique(np.concatenate(
+        [station[0] for station in per_station] + [np.zeros(0)]))
+
+    shape = (len(per_station), len(starts))
+    mean = np.full(shape, np.nan)
+    err = np.full(shape, np.nan)
+    nrows = np.zeros(shape, dtype=int)
+    for i, (station_starts, station_mean, station_err, station_nrows) in \
+            enumerate(per_station):
+        columns = np.searchsorted(starts, station_starts)
+        mean[i, columns] = station_mean
+        err[i, columns] = station_err
+        nrows[i, columns] = station_nrows
+    return starts, mean, err, nrows